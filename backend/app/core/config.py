@@ -1,4 +1,6 @@
 import os
+from typing import Literal
+from pydantic import model_validator
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -6,10 +8,56 @@ class Settings(BaseSettings):
     VERSION: str = "1.0.0"
     
     DATABASE_URL: str
+    # Connection pool, per worker process. Size it so that
+    # replicas x workers x (DB_POOL_SIZE + DB_MAX_OVERFLOW) stays under Postgres max_connections.
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0  # seconds to wait for a free connection
+    DB_POOL_RECYCLE: int = 1800  # replace connections older than this (seconds), -1 = never
+    DB_POOL_PRE_PING: bool = True  # test connections on checkout, drops ones the server closed
+    DB_STATEMENT_CACHE_SIZE: int = 100  # asyncpg prepared statements per connection
+    # Behind PgBouncer in transaction pooling mode: no prepared-statement caching,
+    # unique statement names
+    DB_PGBOUNCER: bool = False
     
     QDRANT_URL: str
     QDRANT_API_KEY: str
+    QDRANT_PREFER_GRPC: bool = False
+    QDRANT_GRPC_PORT: int = 6334
+    QDRANT_TIMEOUT: int = 10  # seconds, applied to every request
+    QDRANT_SEARCH_TIMEOUT: int = 5  # seconds, server-side limit for cache lookups
+    QDRANT_STARTUP_TIMEOUT: float = 30.0  # seconds startup waits for the collection
+    # Collection tuning. Existing collections are migrated to these on startup.
+    QDRANT_QUANTIZATION: Literal["none", "scalar", "binary"] = "none"  # "none", "scalar" (int8, ~4x smaller) or "binary"
+    QDRANT_QUANTIZATION_ALWAYS_RAM: bool = True  # keep quantized vectors in RAM
+    QDRANT_QUANTIZATION_RESCORE: bool = True  # rescore top hits with the original vectors
+    QDRANT_QUANTIZATION_OVERSAMPLING: float = 2.0
+    QDRANT_ON_DISK_VECTORS: bool = False  # keep original vectors on disk (mmap)
+    QDRANT_HNSW_M: int = 16
+    QDRANT_HNSW_EF_CONSTRUCT: int = 100
+    QDRANT_HNSW_EF: int | None = None  # search-time ef, None = Qdrant default
+    # Per-tenant HNSW graphs. With many tenants set QDRANT_HNSW_M=0 and this to 16.
+    QDRANT_HNSW_PAYLOAD_M: int | None = None
+    CACHE_SHARED_TIER: bool = False  # also search the shared "global" partition on a tenant miss
+    # Semantic cache eviction
+    CACHE_TTL_DAYS: int = 365
+    CACHE_MAX_POINTS: int = 200_000  # capacity limit, 0 = unlimited
+    CACHE_EVICTION_POLICY: Literal["lru", "lfu"] = "lru"  # "lru" (last_hit_at) or "lfu" (hits)
+    CACHE_EVICTION_TARGET: float = 0.9  # evict down to this fraction of capacity
+    CACHE_HIT_FLUSH_SECONDS: float = 5.0  # hit stats (L1 and L2) are written to Qdrant in batches
+    CACHE_DELETE_BATCH_SIZE: int = 1000
     THRESHOLD: float = 0.9
+    # In-process exact-match answer cache (L1) in front of Qdrant, 0 entries disables
+    L1_CACHE_MAX_ENTRIES: int = 10_000
+    L1_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    L1_CACHE_TTL_SECONDS: float = 600
+    
+    # Embeddings (micro-batched in a thread pool)
+    EMBEDDING_MODEL: str = "all-MiniLM-L6-v2"
+    EMBEDDING_MAX_BATCH_SIZE: int = 32
+    EMBEDDING_MAX_WAIT_MS: float = 5.0
+    EMBEDDING_WORKERS: int = 1
+    EMBEDDING_CACHE_SIZE: int = 4096  # LRU entries keyed by normalized query, 0 disables
     
     NEO4J_URI: str
     NEO4J_USERNAME: str
@@ -17,6 +65,16 @@ class Settings(BaseSettings):
     NEO4J_DATABASE: str
     AURA_INSTANCEID: str
     AURA_INSTANCENAME: str
+    NEO4J_MAX_POOL_SIZE: int = 50
+    NEO4J_ACQUISITION_TIMEOUT: float = 10.0  # seconds to wait for a pooled connection
+    NEO4J_CONNECTION_TIMEOUT: float = 5.0
+    NEO4J_MAX_CONNECTION_LIFETIME: int = 3600
+    NEO4J_STARTUP_TIMEOUT: float = 30.0  # seconds startup waits for the graph schema
+    # Write-behind buffer for distilled facts. 0 = write each conversation's facts immediately.
+    # Buffered facts live in memory: a distillation job completes before they reach Neo4j,
+    # and a crash loses them. Not allowed with JOB_QUEUE_BACKEND=postgres for that reason.
+    GRAPH_WRITE_FLUSH_INTERVAL: float = 0.0
+    GRAPH_WRITE_BUFFER_SIZE: int = 500
     
     GROQ_API_KEY: str
     GROQ_MODEL: str = "llama-3.3-70b-versatile"
@@ -26,11 +84,64 @@ class Settings(BaseSettings):
     
     USE_LOCAL_AI:bool
     
+    # LLM HTTP pool (shared by every request on a worker)
+    LLM_MAX_CONNECTIONS: int = 50
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    LLM_KEEPALIVE_EXPIRY: float = 30.0
+    LLM_CONNECT_TIMEOUT: float = 5.0
+    LLM_READ_TIMEOUT: float = 120.0
+    LLM_POOL_TIMEOUT: float = 10.0
+    
+    # Chat pipeline: stages run concurrently, a stage that times out is skipped
+    CHAT_CACHE_TIMEOUT: float = 2.0  # treated as a cache miss
+    CHAT_GRAPH_TIMEOUT: float = 3.0  # answer without graph context
+    CHAT_SPECULATIVE_LLM: bool = False  # start the LLM before the cache result, cancel it on a hit
+    
+    # Background jobs (cache writes, distillation)
+    # "local": in-process queue, "postgres": durable queue drained by `python -m app.workers`
+    JOB_QUEUE_BACKEND: Literal["local", "postgres"] = "local"
+    JOB_WORKER_CONCURRENCY: int = 4
+    JOB_MAX_ATTEMPTS: int = 5
+    JOB_RETRY_BACKOFF: float = 2.0  # seconds, doubled on every attempt
+    JOB_POLL_INTERVAL: float = 1.0
+    JOB_VISIBILITY_TIMEOUT: int = 300  # seconds before a running job from a dead worker is retried
+    
+    # Gardener (duplicate-entity detection)
+    GARDENER_WINDOW_SIZE: int = 10  # neighbours compared in key order
+    GARDENER_SIMILARITY_THRESHOLD: float = 0.6  # trigram Jaccard for a candidate pair
+    GARDENER_MAX_CANDIDATES: int = 2000  # per run, bounds LLM cost
+    GARDENER_LLM_BATCH_SIZE: int = 25  # candidate pairs per confirmation prompt
+    GARDENER_MERGE_BATCH_SIZE: int = 100  # merge groups per write transaction
+    # Progress stays this far behind the graph clock: an entity's created_at is its transaction's
+    # start, so a write still committing at read time would otherwise land behind the watermark
+    GARDENER_WATERMARK_LAG_SECONDS: int = 300
+    
+    # Maintenance scheduler (one leader per job via Postgres advisory locks)
+    SCHEDULER_ENABLED: bool = True
+    SCHEDULER_TICK_SECONDS: int = 60  # how often each replica checks whether a job is due
+    PRUNE_GRAPH_INTERVAL_MINUTES: int = 60
+    CLEAN_VECTORS_INTERVAL_MINUTES: int = 24 * 60
+    EVICT_CACHE_INTERVAL_MINUTES: int = 15
+    SCHEDULER_RUN_TIMEOUT_MINUTES: int = 120  # a run still 'running' after this is assumed dead
+    
     # JWT Settings
     JWT_SECRET: str = "cortex-secret-key-change-in-production"
     JWT_ALGORITHM: str = "HS256"
     JWT_EXPIRATION_HOURS: int = 24
     
+    # Password hashing (bcrypt runs in its own thread pool, off the event loop)
+    BCRYPT_ROUNDS: int = 12  # work factor; existing hashes are upgraded on the next login
+    BCRYPT_WORKERS: int = 2  # max concurrent hashes per process, the rest wait their turn
+    
+    @model_validator(mode="after")
+    def _check_graph_write_buffer(self):
+        if self.GRAPH_WRITE_FLUSH_INTERVAL > 0 and self.JOB_QUEUE_BACKEND == "postgres":
+            raise ValueError(
+                "GRAPH_WRITE_FLUSH_INTERVAL must be 0 with JOB_QUEUE_BACKEND=postgres: "
+                "buffered facts would be acknowledged before they are durable"
+            )
+        return self
+    
     class Config:
         env_file = "../.env"
         env_file_encoding = "utf-8"
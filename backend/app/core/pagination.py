@@ -0,0 +1,63 @@
+"""
+Keyset Pagination
+Pages over (timestamp, id) sort keys with opaque cursors.
+
+A cursor encodes the sort key of a row. `before` returns rows that sort
+before that row (older), `after` rows that sort after it (newer). Each page
+is one index range scan of `limit + 1` rows, however deep the page is.
+"""
+import base64
+import binascii
+from datetime import datetime
+from sqlalchemy import Select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    raw = f"{timestamp.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """Raises ValueError for a cursor this module did not produce."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        timestamp, row_id = raw.split("|")
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+async def fetch_page(
+    db: AsyncSession,
+    query: Select,
+    timestamp_column,
+    id_column,
+    limit: int,
+    before: str | None = None,
+    after: str | None = None
+) -> tuple[list, bool, bool]:
+    """
+    Runs `query` for one page next to the cursor (the newest page without one).
+    Returns (rows oldest first, more_before, more_after).
+    """
+    if before and after:
+        raise ValueError("Use either 'before' or 'after', not both")
+
+    key = tuple_(timestamp_column, id_column)
+    if after:
+        query = query.where(key > tuple_(*decode_cursor(after))).order_by(timestamp_column, id_column)
+    else:
+        if before:
+            query = query.where(key < tuple_(*decode_cursor(before)))
+        query = query.order_by(timestamp_column.desc(), id_column.desc())
+
+    result = await db.execute(query.limit(limit + 1))
+    rows = list(result.scalars().all())
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    if after:
+        return rows, True, has_more
+    rows.reverse()
+    return rows, has_more, before is not None
@@ -2,14 +2,96 @@
 Database Configuration
 Async SQLAlchemy engine and session management
 """
+import time
+from uuid import uuid4
+from sqlalchemy import event, exc
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from app.core.config import settings
 
 # Convert sync URL to async URL (postgresql:// -> postgresql+asyncpg://)
 DATABASE_URL = settings.DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://")
 
-engine = create_async_engine(DATABASE_URL, echo=False)
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long checkouts wait for a connection."""
+
+    checkouts = 0
+    timeouts = 0
+    wait_seconds_total = 0.0
+    wait_seconds_max = 0.0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            InstrumentedPool.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            InstrumentedPool.checkouts += 1
+            InstrumentedPool.wait_seconds_total += waited
+            InstrumentedPool.wait_seconds_max = max(InstrumentedPool.wait_seconds_max, waited)
+
+
+def _connect_args() -> dict:
+    if not DATABASE_URL.startswith("postgresql+asyncpg"):
+        return {}
+    if settings.DB_PGBOUNCER:
+        # PgBouncer may hand each transaction a different server connection,
+        # so named prepared statements must not be cached or reused
+        return {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+        }
+    return {"prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE}
+
+
+engine = create_async_engine(
+    DATABASE_URL,
+    echo=False,
+    poolclass=InstrumentedPool,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
+    connect_args=_connect_args()
+)
+
+_pool_events = {"connects": 0, "invalidations": 0}
+
+
+@event.listens_for(engine.sync_engine.pool, "connect")
+def _on_connect(dbapi_connection, connection_record):
+    _pool_events["connects"] += 1
+
+
+@event.listens_for(engine.sync_engine.pool, "invalidate")
+def _on_invalidate(dbapi_connection, connection_record, exception):
+    _pool_events["invalidations"] += 1
+
+
+def pool_stats() -> dict:
+    """Pool occupancy and checkout wait times for /metrics."""
+    pool = engine.sync_engine.pool
+    checkouts = InstrumentedPool.checkouts
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "idle": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "checkouts": checkouts,
+        "checkout_timeouts": InstrumentedPool.timeouts,
+        "checkout_wait_ms_avg": InstrumentedPool.wait_seconds_total / checkouts * 1000 if checkouts else 0.0,
+        "checkout_wait_ms_max": InstrumentedPool.wait_seconds_max * 1000,
+        **_pool_events,
+    }
+
 
 async_session_maker = async_sessionmaker(
     engine, 
@@ -27,8 +109,3 @@ async def get_db():
             yield session
         finally:
             await session.close()
-
-async def init_db():
-    """Create all tables"""
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
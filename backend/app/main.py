@@ -6,15 +6,34 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.database import init_db
+from app.database import pool_stats
 from app.routers import chat, auth, conversations
+from app.services.llm import llm_service
+from app.services.embedding_service import embedder
+from app.services import memory_service, graph_service
+from app.services.job_queue import job_queue
+from app.services.scheduler import scheduler
+from app.services.single_flight import single_flight
+from app.core.config import settings
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """Application lifespan - initialize database on startup"""
-    await init_db()
+    """Application lifespan - start background work, release pools on shutdown (schema: `alembic upgrade head`)"""
+    await embedder.warm_up()  # else the first cache lookup loads it under CHAT_CACHE_TIMEOUT
+    await memory_service.init_client()
+    await graph_service.init_driver()
+    await job_queue.start()
+    if settings.SCHEDULER_ENABLED:
+        await scheduler.start()
     yield
+    await scheduler.stop()
+    await single_flight.stop()
+    await job_queue.stop()
+    await llm_service.aclose()
+    await embedder.close()
+    await memory_service.close_client()
+    await graph_service.close_driver()
 
 
 app = FastAPI(
@@ -31,6 +50,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Prev-Cursor", "X-Next-Cursor"],  # message history pagination
 )
 
 # Register Routers
@@ -53,3 +73,19 @@ async def health_check():
         "service": "Cortex",
         "version": "0.1.0"
     }
+
+
+@app.get("/metrics")
+async def metrics():
+    """Queue depth, worker counters, cache hit rates, DB pool usage and last maintenance runs"""
+    try:
+        maintenance = await scheduler.stats()
+    except Exception as e:
+        maintenance = {"error": str(e)}
+    return {
+        "jobs": await job_queue.stats(),
+        "cache": memory_service.cache_stats(),
+        "coalescing": single_flight.stats(),
+        "db_pool": pool_stats(),
+        "maintenance": maintenance
+    }
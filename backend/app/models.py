@@ -1,9 +1,10 @@
 """
 Database Models
-SQLAlchemy models for User, Conversation, and Message
+SQLAlchemy models for User, Conversation, Message, Job, and MaintenanceRun
 """
 from datetime import datetime
-from sqlalchemy import String, Text, ForeignKey, DateTime, func
+from typing import Any
+from sqlalchemy import String, Text, ForeignKey, DateTime, Integer, Float, JSON, Index, desc, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.database import Base
 
@@ -26,6 +27,10 @@ class User(Base):
 
 class Conversation(Base):
     __tablename__ = "conversations"
+    __table_args__ = (
+        # A user's conversations, most recently active first (id breaks ties for the page cursor)
+        Index("ix_conversations_owner_id_updated_at_id", "owner_id", desc("updated_at"), desc("id")),
+    )
     
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     title: Mapped[str] = mapped_column(String(255), default="New Conversation")
@@ -38,12 +43,16 @@ class Conversation(Base):
     messages: Mapped[list["Message"]] = relationship(
         back_populates="conversation",
         cascade="all, delete-orphan",
-        order_by="Message.created_at"
+        order_by="[Message.created_at, Message.id]"
     )
 
 
 class Message(Base):
     __tablename__ = "messages"
+    __table_args__ = (
+        # A conversation's history in order (id breaks ties for the page cursor)
+        Index("ix_messages_conversation_id_created_at_id", "conversation_id", "created_at", "id"),
+    )
     
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     conversation_id: Mapped[int] = mapped_column(ForeignKey("conversations.id", ondelete="CASCADE"), nullable=False)
@@ -53,3 +62,38 @@ class Message(Base):
     
     # Relationships
     conversation: Mapped["Conversation"] = relationship(back_populates="messages")
+
+
+class Job(Base):
+    """Durable background job (cache write, distillation) claimed by app.workers."""
+    __tablename__ = "jobs"
+    __table_args__ = (
+        Index("ix_jobs_status_run_at", "status", "run_at"),
+    )
+    
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    kind: Mapped[str] = mapped_column(String(50), nullable=False)
+    payload: Mapped[dict[str, Any]] = mapped_column(JSON, nullable=False)
+    status: Mapped[str] = mapped_column(String(20), default="pending", nullable=False)  # "pending", "running" or "failed"
+    attempts: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    max_attempts: Mapped[int] = mapped_column(Integer, nullable=False)
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    run_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
+    created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
+    updated_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now(), onupdate=func.now())
+
+
+class MaintenanceRun(Base):
+    """One execution of a scheduled maintenance job (see services/scheduler.py)."""
+    __tablename__ = "maintenance_runs"
+    __table_args__ = (
+        Index("ix_maintenance_runs_job_started_at", "job", "started_at"),
+    )
+    
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    job: Mapped[str] = mapped_column(String(50), nullable=False)
+    status: Mapped[str] = mapped_column(String(20), nullable=False)  # "running", "success" or "failed"
+    started_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    duration_ms: Mapped[float | None] = mapped_column(Float, nullable=True)  # None while running
+    error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    replica: Mapped[str | None] = mapped_column(String(255), nullable=True)
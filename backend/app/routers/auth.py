@@ -2,6 +2,8 @@
 Authentication Router
 Handles user signup, login, and profile updates
 """
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy import select
@@ -16,22 +18,44 @@ from app.core.config import settings
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
+# A bcrypt hash takes ~250 ms of CPU at 12 rounds. It runs on a small dedicated
+# pool so a burst of logins queues here instead of blocking chat requests.
+_hashing_pool = ThreadPoolExecutor(max_workers=settings.BCRYPT_WORKERS, thread_name_prefix="bcrypt")
 
-def hash_password(password: str) -> str:
-    """Hash password using bcrypt"""
+
+def _hash_password_sync(password: str) -> str:
     password_bytes = password.encode('utf-8')
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(rounds=settings.BCRYPT_ROUNDS)
     return bcrypt.hashpw(password_bytes, salt).decode('utf-8')
 
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify password against hash"""
+def _verify_password_sync(plain_password: str, hashed_password: str) -> bool:
     return bcrypt.checkpw(
         plain_password.encode('utf-8'), 
         hashed_password.encode('utf-8')
     )
 
 
+async def hash_password(password: str) -> str:
+    """Hash password using bcrypt"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_hashing_pool, _hash_password_sync, password)
+
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """Verify password against hash"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_hashing_pool, _verify_password_sync, plain_password, hashed_password)
+
+
+def needs_rehash(hashed_password: str) -> bool:
+    """True if the hash was made with a different work factor than BCRYPT_ROUNDS ($2b$<rounds>$...)."""
+    try:
+        return int(hashed_password.split("$")[2]) != settings.BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
+
 def create_access_token(user_id: int) -> str:
     expire = datetime.utcnow() + timedelta(hours=settings.JWT_EXPIRATION_HOURS)
     payload = {
@@ -66,7 +90,7 @@ async def signup(request: SignupRequest, db: AsyncSession = Depends(get_db)):
     # Create new user
     user = User(
         email=request.email,
-        hashed_password=hash_password(request.password),
+        hashed_password=await hash_password(request.password),
         name=request.name
     )
     db.add(user)
@@ -92,12 +116,17 @@ async def login(request: LoginRequest, db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(User).where(User.email == request.email))
     user = result.scalar_one_or_none()
     
-    if not user or not verify_password(request.password, user.hashed_password):
+    if not user or not await verify_password(request.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid credentials"
         )
     
+    # Upgrade the hash if BCRYPT_ROUNDS changed since it was made
+    if needs_rehash(user.hashed_password):
+        user.hashed_password = await hash_password(request.password)
+        await db.commit()
+    
     # Generate token
     token = create_access_token(user.id)
     
@@ -144,7 +173,7 @@ async def update_user(
         user.name = request.name
     
     if request.password is not None:
-        user.hashed_password = hash_password(request.password)
+        user.hashed_password = await hash_password(request.password)
     
     await db.commit()
     await db.refresh(user)
@@ -2,20 +2,29 @@
 Chat Router
 Handles chat messages with AI integration
 """
-from fastapi import APIRouter, BackgroundTasks, Depends
-from sqlalchemy import select
+import asyncio
+import json
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, insert, update, literal, func
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.database import get_db
+from app.core.config import settings
+from app.database import get_db, async_session_maker
 from app.models import Conversation, Message
 from app.schemas import ChatRequest, ChatResponse
 from app.services import memory_service
 from app.services import graph_service
-from app.services import distiller
+from app.services import job_queue
+from app.services.embedding_service import embed
 from app.services.llm import llm_service
+from app.services.single_flight import single_flight, Flight
 
 router = APIRouter(prefix="/api", tags=["Chat"])
 
+# Shown when the model fails; never saved or cached
+OFFLINE_ANSWER = "I'm sorry, my brain is offline right now."
+
 
 def extract_entities_simple(query: str) -> list[str]:
     """Simple entity extraction from query using keyword matching."""
@@ -28,92 +37,305 @@ def extract_entities_simple(query: str) -> list[str]:
     return entities
 
 
-@router.post("/chat", response_model=ChatResponse)
-async def chat_endpoint(
-    request: ChatRequest, 
-    background_tasks: BackgroundTasks,
-    db: AsyncSession = Depends(get_db)
-):
+async def _prepare_conversation(db: AsyncSession, request: ChatRequest) -> int | None:
     """
-    Send a chat message and get AI response.
-    Optionally saves to a conversation.
+    Creates the conversation if needed and saves the user message, in one
+    statement and one commit. Returns the conversation id.
     """
     user_query = request.message
     conversation_id = request.conversation_id
     
-    # If no conversation_id, create a new conversation
+    # If no conversation_id, create the conversation and its first message together
     if conversation_id is None and request.user_id:
-        # Create new conversation with first message as title
+        # New conversation with first message as title
         title = user_query[:50] + "..." if len(user_query) > 50 else user_query
-        conversation = Conversation(
-            owner_id=request.user_id,
-            title=title
+        conversation = (
+            insert(Conversation)
+            .values(owner_id=request.user_id, title=title)
+            .returning(Conversation.id)
+            .cte("new_conversation")
+        )
+        conversation_id = await db.scalar(
+            insert(Message)
+            .from_select(
+                ["conversation_id", "role", "content"],
+                select(conversation.c.id, literal("user"), literal(user_query))
+            )
+            .returning(Message.conversation_id)
+            .add_cte(conversation)
         )
-        db.add(conversation)
         await db.commit()
-        await db.refresh(conversation)
-        conversation_id = conversation.id
+        return conversation_id
     
     # Save user message to database
-    if conversation_id:
-        user_message = Message(
-            conversation_id=conversation_id,
-            role="user",
-            content=user_query
+    await _save_message(db, conversation_id, "user", user_query)
+    return conversation_id
+
+
+async def _save_message(db: AsyncSession, conversation_id: int | None, role: str, content: str):
+    """
+    Saves a single chat message and bumps the conversation's updated_at,
+    in one statement and one commit. Does nothing if the conversation is gone.
+    """
+    if not conversation_id:
+        return
+    conversation = (
+        update(Conversation)
+        .where(Conversation.id == conversation_id)
+        .values(updated_at=func.now())
+        .returning(Conversation.id)
+        .cte("touched_conversation")
+    )
+    await db.execute(
+        insert(Message)
+        .from_select(
+            ["conversation_id", "role", "content"],
+            select(conversation.c.id, literal(role), literal(content))
         )
-        db.add(user_message)
-        await db.commit()
-    
-    # --- STEP 1: CHECK QDRANT (Memory Cache) ---
-    cached_answer = memory_service.check_cache(user_query)
+        .add_cte(conversation)
+    )
+    await db.commit()
+
+
+async def _build_graph_context(user_query: str) -> str:
+    """Collects facts from the graph for every entity mentioned in the query, in one lookup."""
+    entities = extract_entities_simple(user_query)
+    facts_by_entity = await graph_service.get_facts_for_entities(entities)
+    return "".join(
+        "\n".join(facts) + "\n" for facts in facts_by_entity.values()
+    )
+
+
+async def _stage(name: str, coro, timeout: float, fallback):
+    """
+    Runs one pipeline stage, falling back instead of failing the request if it is slow or broken.
+    The timeout only covers the lookup itself: clients are set up at startup, outside any request.
+    """
+    try:
+        return await asyncio.wait_for(coro, timeout)
+    except asyncio.TimeoutError:
+        print(f"⏱️ Chat stage '{name}' timed out after {timeout}s, continuing without it")
+    except Exception as e:
+        print(f"⚠️ Chat stage '{name}' failed, continuing without it: {e}")
+    return fallback
+
+
+def _answer_source(user_query: str, graph_lookup: asyncio.Task):
+    """
+    Graph context + LLM call for a query, as a token iterator for single_flight.
+    Always streams, so streaming and non-streaming requests can share a flight:
+    streaming joiners get tokens as they come, and a model error fails the flight
+    for everyone instead of passing an apology off as the answer.
+    """
+    async def source():
+        graph_context = await graph_lookup
+        async for token in llm_service.stream_answer(user_query, context=graph_context):
+            yield token
+    return source
+
+
+async def _after_answer(user_query: str, answer: str, user_ids: set[int | None]):
+    """Runs once per generated answer: caches it for every user who asked and distills it once."""
+    # L1 first, before any await: the flight is already unregistered (see single_flight)
+    for user_id in user_ids:
+        memory_service.remember_answer(user_query, answer, user_id=user_id)
+    # Embedded by the cache lookup already; shipping it saves the worker an embedding
+    vector = await embed(user_query)
+    for user_id in user_ids:
+        await job_queue.enqueue(
+            "save_to_cache", query=user_query, answer=answer, user_id=user_id, vector=vector
+        )
+    await job_queue.enqueue("distill_conversation", user_query=user_query, ai_response=answer)
+
+
+def _join_answer(request: ChatRequest, graph_lookup: asyncio.Task) -> Flight:
+    """The in-flight answer for this query, shared with identical concurrent requests."""
+    user_query = request.message
+    flight = single_flight.join(
+        user_query,
+        request.user_id,
+        source=_answer_source(user_query, graph_lookup),
+        on_done=lambda answer, user_ids: _after_answer(user_query, answer, user_ids)
+    )
+    if flight.waiting > 1:
+        graph_lookup.cancel()  # joined someone else's flight, which has its own context
+    return flight
+
+
+def _drop_answer(user_query: str, flight: Flight | None, graph_lookup: asyncio.Task):
+    """Stops work this request no longer needs. A cancelled flight cancels the graph lookup it awaits."""
+    if flight is None:
+        graph_lookup.cancel()
+    else:
+        single_flight.abandon(user_query, flight)
+
+
+async def _run_stages(
+    db: AsyncSession, request: ChatRequest
+) -> tuple[int | None, str | None, Flight | None]:
+    """
+    Runs the chat stages as a graph instead of one after another:
+    the user-message write, the cache lookup and the graph lookup start together,
+    and the LLM starts as soon as the graph context is ready and the cache missed.
+    With CHAT_SPECULATIVE_LLM the LLM starts right away and is cancelled on a cache hit.
+
+    Returns (conversation_id, cached_answer, flight); exactly one of the last two is set.
+    """
+    user_query = request.message
+    graph_lookup = asyncio.create_task(
+        _stage("graph", _build_graph_context(user_query), settings.CHAT_GRAPH_TIMEOUT, "")
+    )
+    flight = _join_answer(request, graph_lookup) if settings.CHAT_SPECULATIVE_LLM else None
+
+    try:
+        conversation_id, cached_answer = await asyncio.gather(
+            _prepare_conversation(db, request),
+            _stage(
+                "cache",
+                memory_service.check_cache(user_query, user_id=request.user_id),
+                settings.CHAT_CACHE_TIMEOUT,
+                None
+            )
+        )
+    except BaseException:
+        _drop_answer(user_query, flight, graph_lookup)
+        raise
+
+    if cached_answer:
+        _drop_answer(user_query, flight, graph_lookup)
+        return conversation_id, cached_answer, None
+
+    if flight is None:
+        flight = _join_answer(request, graph_lookup)
+    return conversation_id, None, flight
+
+
+_pending_saves: set[asyncio.Task] = set()
+
+
+def _save_answer_later(
+    conversation_id: int | None, cached_answer: str | None, flight: Flight | None
+) -> asyncio.Task:
+    """
+    Saves the assistant message in its own task once the answer is complete,
+    so a client disconnecting mid-stream cannot cancel the write.
+    Never raises: failures are logged, the answer has been streamed either way.
+    """
+    async def save():
+        try:
+            answer = cached_answer if flight is None else await flight.result()
+        except Exception as e:
+            print(f"⚠️ Answer failed, assistant message not saved: {e}")
+            return
+        try:
+            # The request-scoped session may already be closed once streaming starts
+            async with async_session_maker() as session:
+                await _save_message(session, conversation_id, "assistant", answer)
+        except Exception as e:
+            print(f"⚠️ Failed to save assistant message: {e}")
+
+    task = asyncio.create_task(save())
+    _pending_saves.add(task)
+    task.add_done_callback(_pending_saves.discard)
+    return task
+
+
+def _sse_event(data: dict, event: str | None = None) -> str:
+    """Formats a payload as a Server-Sent Event frame."""
+    frame = f"event: {event}\n" if event else ""
+    return frame + f"data: {json.dumps(data)}\n\n"
+
+
+@router.post("/chat", response_model=ChatResponse)
+async def chat_endpoint(
+    request: ChatRequest, 
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Send a chat message and get AI response.
+    Optionally saves to a conversation.
+    """
+    # --- STEPS 1-3: SAVE USER MESSAGE | CHECK CACHE | CHECK GRAPH -> LLM (concurrent) ---
+    conversation_id, cached_answer, flight = await _run_stages(db, request)
     if cached_answer:
         # Save assistant response to database
-        if conversation_id:
-            assistant_message = Message(
-                conversation_id=conversation_id,
-                role="assistant",
-                content=cached_answer
-            )
-            db.add(assistant_message)
-            await db.commit()
+        await _save_message(db, conversation_id, "assistant", cached_answer)
         
         return ChatResponse(
             message=cached_answer,
             conversation_id=conversation_id
         )
 
-    # --- STEP 2: CHECK GRAPH (Neo4j Facts) ---
-    graph_context = ""
-    entities = extract_entities_simple(user_query)
-    for entity in entities:
-        try:
-            facts = graph_service.get_entity_facts(entity)
-            if facts:
-                graph_context += "\n".join(facts) + "\n"
-        except Exception as e:
-            print(f"Graph lookup error for '{entity}': {e}")
+    # Shared with identical concurrent queries.
+    # STEPS 4 & 5 (save to cache / graph) run once the shared answer lands (_after_answer).
+    try:
+        new_answer = await flight.result()
+    except Exception as e:
+        # The flight failed, so nothing was cached; don't save the apology either
+        print(f"❌ Chat Error: {e}")
+        return ChatResponse(
+            message=OFFLINE_ANSWER,
+            conversation_id=conversation_id
+        )
 
-    # --- STEP 3: GENERATE ANSWER (LLM) ---
-    new_answer = await llm_service.generate_answer(user_query, context=graph_context)
-    
-    # --- STEP 4: SAVE TO QDRANT (Background) ---
-    background_tasks.add_task(memory_service.save_to_cache, user_query, new_answer)
-    
-    # --- STEP 5: SAVE TO GRAPH (Background) ---
-    background_tasks.add_task(distiller.distill_conversation, user_query, new_answer)
-    
     # Save assistant response to database
-    if conversation_id:
-        assistant_message = Message(
-            conversation_id=conversation_id,
-            role="assistant",
-            content=new_answer
-        )
-        db.add(assistant_message)
-        await db.commit()
+    await _save_message(db, conversation_id, "assistant", new_answer)
     
     return ChatResponse(
         message=new_answer,
         conversation_id=conversation_id,
         raw_response=new_answer if request.smart_mode else None
     )
+
+
+@router.post("/chat/stream")
+async def chat_stream_endpoint(
+    request: ChatRequest, 
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Send a chat message and stream the AI response as Server-Sent Events.
+    
+    Events:
+      start  -> {"conversation_id": ...}
+      (none) -> {"token": "..."} for every generated chunk
+      done   -> {"message": "<full answer>", "conversation_id": ..., "cached": bool}
+      error  -> {"message": "..."} if the model failed mid-answer (nothing is saved or cached)
+    """
+    # --- STEPS 1-3: SAVE USER MESSAGE | CHECK CACHE | CHECK GRAPH -> LLM (concurrent) ---
+    conversation_id, cached_answer, flight = await _run_stages(db, request)
+    # Started before streaming, so the message is saved even if the client disconnects
+    saved = _save_answer_later(conversation_id, cached_answer, flight)
+    
+    async def event_stream():
+        yield _sse_event({"conversation_id": conversation_id}, event="start")
+        
+        if cached_answer:
+            yield _sse_event({"token": cached_answer})
+            answer = cached_answer
+        else:
+            chunks = []
+            try:
+                async for token in flight.stream():
+                    chunks.append(token)
+                    yield _sse_event({"token": token})
+            except Exception:
+                yield _sse_event({"message": OFFLINE_ANSWER}, event="error")
+                return
+            answer = "".join(chunks)
+        
+        await asyncio.shield(saved)
+        
+        yield _sse_event(
+            {"message": answer, "conversation_id": conversation_id, "cached": bool(cached_answer)},
+            event="done"
+        )
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        }
+    )
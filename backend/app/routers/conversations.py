@@ -2,23 +2,34 @@
 Conversations Router
 CRUD operations for conversations and messages
 """
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy import select
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
+from app.core.pagination import encode_cursor, fetch_page
 from app.database import get_db
 from app.models import Conversation, Message
 from app.schemas import (
     ConversationCreate, 
     ConversationResponse, 
     ConversationList, 
+    ConversationCount,
     ConversationUpdate,
     MessageResponse
 )
 
 router = APIRouter(prefix="/api/conversations", tags=["Conversations"])
 
+MAX_CONVERSATIONS_PAGE = 200
+MAX_MESSAGES_PAGE = 500
+
+
+async def _count_conversations(db: AsyncSession, user_id: int) -> int:
+    return await db.scalar(
+        select(func.count()).select_from(Conversation).where(Conversation.owner_id == user_id)
+    )
+
 
 @router.post("", response_model=ConversationResponse)
 async def create_conversation(
@@ -40,47 +51,87 @@ async def create_conversation(
 @router.get("/{user_id}", response_model=ConversationList)
 async def get_user_conversations(
     user_id: int,
+    limit: int = Query(50, ge=1, le=MAX_CONVERSATIONS_PAGE),
+    before: str | None = Query(None, description="next_cursor of the previous page"),
+    after: str | None = Query(None, description="prev_cursor of the previous page"),
+    include_total: bool = False,
     db: AsyncSession = Depends(get_db)
 ):
-    """Get all conversations for a user"""
-    result = await db.execute(
-        select(Conversation)
-        .where(Conversation.owner_id == user_id)
-        .order_by(Conversation.updated_at.desc())
-    )
-    conversations = result.scalars().all()
+    """Get a page of a user's conversations, most recently updated first"""
+    try:
+        conversations, more_before, more_after = await fetch_page(
+            db,
+            select(Conversation).where(Conversation.owner_id == user_id),
+            Conversation.updated_at,
+            Conversation.id,
+            limit=limit,
+            before=before,
+            after=after
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    conversations.reverse()
     
     return ConversationList(
         conversations=[ConversationResponse.model_validate(c) for c in conversations],
-        total=len(conversations)
+        next_cursor=encode_cursor(conversations[-1].updated_at, conversations[-1].id) if conversations and more_before else None,
+        prev_cursor=encode_cursor(conversations[0].updated_at, conversations[0].id) if conversations and more_after else None,
+        total=await _count_conversations(db, user_id) if include_total else None
     )
 
 
+@router.get("/{user_id}/count", response_model=ConversationCount)
+async def count_user_conversations(
+    user_id: int,
+    db: AsyncSession = Depends(get_db)
+):
+    """Number of conversations a user has (index-only count)"""
+    return ConversationCount(total=await _count_conversations(db, user_id))
+
+
 @router.get("/{conversation_id}/messages", response_model=list[MessageResponse])
 async def get_conversation_messages(
     conversation_id: int,
+    response: Response,
+    limit: int = Query(100, ge=1, le=MAX_MESSAGES_PAGE),
+    before: str | None = Query(None, description="X-Prev-Cursor of the previous page"),
+    after: str | None = Query(None, description="X-Next-Cursor of the previous page"),
     db: AsyncSession = Depends(get_db)
 ):
-    """Get all messages in a conversation"""
+    """
+    Get a page of messages in a conversation, oldest first.
+    Without a cursor this is the latest page. Cursors for the adjacent pages
+    are returned in the X-Prev-Cursor (older) and X-Next-Cursor (newer) headers.
+    """
     # Verify conversation exists
-    result = await db.execute(
-        select(Conversation).where(Conversation.id == conversation_id)
+    exists = await db.scalar(
+        select(Conversation.id).where(Conversation.id == conversation_id)
     )
-    conversation = result.scalar_one_or_none()
     
-    if not conversation:
+    if not exists:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Conversation not found"
         )
     
     # Get messages
-    result = await db.execute(
-        select(Message)
-        .where(Message.conversation_id == conversation_id)
-        .order_by(Message.created_at)
-    )
-    messages = result.scalars().all()
+    try:
+        messages, more_before, more_after = await fetch_page(
+            db,
+            select(Message).where(Message.conversation_id == conversation_id),
+            Message.created_at,
+            Message.id,
+            limit=limit,
+            before=before,
+            after=after
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    if messages and more_before:
+        response.headers["X-Prev-Cursor"] = encode_cursor(messages[0].created_at, messages[0].id)
+    if messages and more_after:
+        response.headers["X-Next-Cursor"] = encode_cursor(messages[-1].created_at, messages[-1].id)
     
     return [MessageResponse.model_validate(m) for m in messages]
 
@@ -72,6 +72,12 @@ class ConversationResponse(BaseModel):
 
 class ConversationList(BaseModel):
     conversations: list[ConversationResponse]
+    next_cursor: str | None = None  # pass as `before` for older conversations
+    prev_cursor: str | None = None  # pass as `after` for newer conversations
+    total: int | None = None  # only with include_total=true
+
+
+class ConversationCount(BaseModel):
     total: int
 
 
@@ -0,0 +1,96 @@
+"""
+Answer Cache
+In-process exact-match cache (L1) in front of the Qdrant semantic cache (L2).
+
+Byte-identical repeat questions (after normalization) are answered from a
+dict lookup, skipping the embedding and the ANN search. Entries expire after
+L1_CACHE_TTL_SECONDS and the least recently used ones are dropped once the
+cache holds more than L1_CACHE_MAX_ENTRIES answers or L1_CACHE_MAX_BYTES of text.
+Each API worker has its own copy; nothing is shared between replicas.
+Entries remember the Qdrant point they stand for, so L1 hits still count
+towards that point's eviction stats.
+"""
+import hashlib
+import time
+from collections import OrderedDict
+from app.core.config import settings
+from app.services.embedding_service import normalize_query
+
+
+def cache_key(query: str, tenant: str) -> str:
+    return hashlib.sha256(f"{tenant}\0{normalize_query(query)}".encode()).hexdigest()
+
+
+class AnswerCache:
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        # key -> (expires_at, answer, size, point_id)
+        self._entries: OrderedDict[str, tuple[float, str, int, str | None]] = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl_seconds > 0
+
+    def get(self, query: str, tenant: str) -> tuple[str, str | None] | None:
+        """(answer, point_id) for a fresh entry, else None."""
+        if not self.enabled:
+            return None
+        key = cache_key(query, tenant)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, answer, _, point_id = entry
+        if expires_at <= time.monotonic():
+            self._drop(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return answer, point_id
+
+    def put(self, query: str, tenant: str, answer: str, point_id: str | None = None):
+        if not self.enabled:
+            return
+        size = len(answer.encode())
+        if size > self.max_bytes:
+            return
+        key = cache_key(query, tenant)
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, answer, size, point_id)
+        self.bytes += size
+        while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _drop(self, key: str):
+        _, _, size, _ = self._entries.pop(key)
+        self.bytes -= size
+
+    def clear(self):
+        self._entries.clear()
+        self.bytes = 0
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+answer_cache = AnswerCache(
+    max_entries=settings.L1_CACHE_MAX_ENTRIES,
+    max_bytes=settings.L1_CACHE_MAX_BYTES,
+    ttl_seconds=settings.L1_CACHE_TTL_SECONDS
+)
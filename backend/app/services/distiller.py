@@ -4,7 +4,7 @@ from app.services import graph_service
 async def distill_conversation(user_query: str, ai_response: str):
     """
     Analyzes the Q&A pair to find new facts and saves them to the Graph.
-    This should run in the background.
+    This should run in the background (see job_queue); failures are re-raised so the job is retried.
     """    
     try:
         print(f"\n🧪 DISTILLER")
@@ -23,6 +23,7 @@ async def distill_conversation(user_query: str, ai_response: str):
         for i, fact in enumerate(facts):
             print(f"   [{i+1}] {fact}")
         
+        triples = []
         for fact in facts:
             # Use .get() for safe access - LLM may return different key names
             head = fact.get("head") or fact.get("subject") or fact.get("entity1")
@@ -32,10 +33,14 @@ async def distill_conversation(user_query: str, ai_response: str):
             if head and relation and tail:
                 relation = relation.upper().replace(" ", "_").strip()
                 print(f"   → Saving: ({head}) -[{relation}]-> ({tail})")
-                graph_service.add_relationship(head, relation, tail)
+                triples.append((head, relation, tail))
             else:
                 print(f"   ⚠️ Skipped incomplete fact: {fact}")
+        
+        # One transaction for the whole conversation (or buffered across conversations)
+        await graph_service.write_facts(triples)
                 
         print("   ✅ Distillation complete")
     except Exception as e:
-        print(f"   ⚠️ Distillation failed: {e}")
\ No newline at end of file
+        print(f"   ⚠️ Distillation failed: {e}")
+        raise
\ No newline at end of file
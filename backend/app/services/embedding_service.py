@@ -0,0 +1,167 @@
+import asyncio
+import re
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from sentence_transformers import SentenceTransformer
+from app.core.config import settings
+
+
+def normalize_query(text: str) -> str:
+    """Canonical form of a query: trimmed, lowercased, single-spaced."""
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+class EmbeddingCache:
+    """
+    Bounded LRU of query vectors keyed by normalized text.
+    Concurrent lookups of the same text share a single encode.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._vectors: OrderedDict[str, list[float]] = OrderedDict()
+        self._pending: dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def get_or_encode(self, text: str, encode) -> list[float]:
+        if self.max_size <= 0:
+            return await encode(text)
+
+        key = normalize_query(text)
+        vector = self._vectors.get(key)
+        if vector is not None:
+            self._vectors.move_to_end(key)
+            self.hits += 1
+            return vector
+
+        task = self._pending.get(key)
+        if task is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            task = asyncio.create_task(encode(text))
+            self._pending[key] = task
+            task.add_done_callback(lambda t: self._store(key, t))
+        # Shielded so a cancelled caller doesn't cancel the encode for the others
+        return await asyncio.shield(task)
+
+    def _store(self, key: str, task: asyncio.Task):
+        self._pending.pop(key, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        self._vectors[key] = task.result()
+        if len(self._vectors) > self.max_size:
+            self._vectors.popitem(last=False)
+
+
+class EmbeddingBatcher:
+    """
+    Collects concurrent encode() calls into batches and runs them in a thread pool.
+    A batch is flushed when it reaches max_batch_size or when its oldest
+    request has waited max_wait_ms, whichever comes first.
+    """
+
+    def __init__(self, model_name: str, max_batch_size: int, max_wait_ms: float, workers: int):
+        self.model_name = model_name
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="embedder")
+        self._model = None
+        self._queue: asyncio.Queue | None = None
+        self._worker: asyncio.Task | None = None
+        self._inflight: set[asyncio.Task] = set()
+        self._slots = asyncio.Semaphore(workers)
+
+    def _load_model(self):
+        if self._model is None:
+            print("📦 Loading sentence transformer model...")
+            self._model = SentenceTransformer(self.model_name)
+            print(f"✅ Model loaded: {self.model_name}")
+        return self._model
+
+    def _encode_batch(self, texts: list[str]) -> list[list[float]]:
+        """Runs in the executor thread."""
+        model = self._load_model()
+        return model.encode(texts, batch_size=len(texts)).tolist()
+
+    async def warm_up(self):
+        """Loads the model and runs one encode, so the first request doesn't pay for it."""
+        await asyncio.get_running_loop().run_in_executor(
+            self._executor, self._encode_batch, ["warm up"]
+        )
+
+    def _ensure_worker(self):
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._collect())
+
+    async def encode(self, text: str) -> list[float]:
+        """Embeds a single text. Resolves once the batch containing it has been encoded."""
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future))
+        return await future
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # Wait for a free executor slot so batches keep growing while the pool is busy
+            await self._slots.acquire()
+            task = asyncio.create_task(self._run_batch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _run_batch(self, batch: list[tuple[str, asyncio.Future]]):
+        texts = [text for text, _ in batch]
+        try:
+            vectors = await asyncio.get_running_loop().run_in_executor(
+                self._executor, self._encode_batch, texts
+            )
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self._slots.release()
+
+        for (_, future), vector in zip(batch, vectors):
+            if not future.done():
+                future.set_result(vector)
+
+    async def close(self):
+        if self._worker:
+            self._worker.cancel()
+            self._worker = None
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+embedder = EmbeddingBatcher(
+    model_name=settings.EMBEDDING_MODEL,
+    max_batch_size=settings.EMBEDDING_MAX_BATCH_SIZE,
+    max_wait_ms=settings.EMBEDDING_MAX_WAIT_MS,
+    workers=settings.EMBEDDING_WORKERS
+)
+
+
+embedding_cache = EmbeddingCache(max_size=settings.EMBEDDING_CACHE_SIZE)
+
+
+async def embed(text: str) -> list[float]:
+    """
+    Converts text to a vector of size 384 numbers.
+    Repeated queries (and the cache write after a lookup miss) reuse the cached vector.
+    """
+    return await embedding_cache.get_or_encode(text, embedder.encode)
@@ -0,0 +1,67 @@
+"""
+Entity Matching
+Candidate generation for duplicate-entity detection.
+
+Names are reduced to a blocking key (case, spacing and punctuation removed).
+Candidates are then found with a sorted-neighbourhood pass: every name is
+compared only with the next few names in key order, using character-trigram
+similarity. The pass runs over a stream in O(n) time and O(window) memory,
+so it works the same for a thousand entities or a few million.
+"""
+from collections import deque
+from typing import AsyncIterable
+
+
+def entity_key(name: str) -> str:
+    """Blocking key: 'Space X', 'spacex' and 'Space-X' all become 'spacex'."""
+    return "".join(ch for ch in name.casefold() if ch.isalnum())
+
+
+def trigrams(key: str) -> set[str]:
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(a: str, b: str) -> float:
+    """Jaccard similarity of the two keys' character trigrams."""
+    if a == b:
+        return 1.0
+    grams_a, grams_b = trigrams(a), trigrams(b)
+    return len(grams_a & grams_b) / len(grams_a | grams_b)
+
+
+async def sorted_neighbourhood_pairs(
+    entities: AsyncIterable[tuple[str, str]],
+    window: int,
+    threshold: float
+):
+    """
+    Yields (name_a, name_b, score) candidate pairs.
+
+    `entities` must be (name, key) tuples ordered by key. Names that share a
+    key always pair up; other names pair up when they sit within `window`
+    positions of each other and their keys are at least `threshold` similar.
+    """
+    recent: deque[tuple[str, str]] = deque(maxlen=window)
+    same_key: list[str] = []
+    current_key = None
+
+    async for name, key in entities:
+        if not key:
+            continue
+        if key != current_key:
+            same_key = []
+            current_key = key
+
+        for other in same_key:
+            yield other, name, 1.0
+
+        for other_name, other_key in recent:
+            if other_key == key:
+                continue  # already paired above
+            score = similarity(key, other_key)
+            if score >= threshold:
+                yield other_name, name, score
+
+        same_key.append(name)
+        recent.append((name, key))
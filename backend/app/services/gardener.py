@@ -2,40 +2,110 @@ import json
 import time
 import re
 from qdrant_client.http import models
+from app.core.config import settings
 from app.services import graph_service
+from app.services.entity_matching import similarity, sorted_neighbourhood_pairs
 from app.services.llm import llm_service
-from app.services.memory_service import client as qdrant_client, COLLECTION_NAME
+from app.services.memory_service import get_client as get_qdrant_client, COLLECTION_NAME
 
-async def prune_graph():
+PRUNE_JOB = "prune_graph"
+
+async def _find_candidates(
+    resume_after: tuple[str, str] | None = None
+) -> tuple[list[tuple[str, str]], tuple[str, str] | None]:
     """
-    Scans the graph for similar entities and merges them.
-    Example: Merges 'Space X' into 'SpaceX'.
+    Candidate generation: streams entities in blocking-key order and keeps
+    pairs that share a key or look alike within the sliding window.
+
+    Stops at an entity boundary once GARDENER_MAX_CANDIDATES is reached.
+    Returns (candidates, stopped_at) where stopped_at is the (key, name) of the
+    last entity whose pairs were all collected, or None if the pass finished.
+    Pass it back as `resume_after` to continue: the walk starts over so the
+    window is filled again, but only pairs for later entities are collected.
     """
-    print("Gardener: Starting graph maintenance...")
+    position = None
 
-    # 1. Fetch all entity names from Neo4j
-    query = "MATCH (n:Entity) RETURN n.name as name"
-    entities = []
-    
-    try:
-        with graph_service.driver.session() as session:
-            result = session.run(query)
-            entities = [record["name"] for record in result]
-            
-    except Exception as e:
-        print(f"Gardener Error: Could not fetch entities from Graph. {e}")
-        return
+    async def entities():
+        nonlocal position
+        async for name, key in graph_service.iter_entities_by_key():
+            position = (key, name)
+            yield name, key
 
-    if len(entities) < 2:
-        print("Gardener: Not enough data to prune.")
-        return
+    candidates = []
+    pending = []  # pairs for the entity at `pending_at`
+    pending_at = None
+    done_with = resume_after
+    pairs = sorted_neighbourhood_pairs(
+        entities(),
+        window=settings.GARDENER_WINDOW_SIZE,
+        threshold=settings.GARDENER_SIMILARITY_THRESHOLD
+    )
+    async for name_a, name_b, score in pairs:
+        if resume_after is not None and position <= resume_after:
+            continue
+        if position != pending_at:
+            if candidates and len(candidates) + len(pending) > settings.GARDENER_MAX_CANDIDATES:
+                print(f"Gardener: Candidate limit reached ({len(candidates)}), the rest waits for the next run.")
+                return candidates, done_with
+            candidates.extend(pending)
+            done_with = pending_at or done_with
+            pending, pending_at = [], position
+        pending.append((name_a, name_b))
+
+    if candidates and len(candidates) + len(pending) > settings.GARDENER_MAX_CANDIDATES:
+        print(f"Gardener: Candidate limit reached ({len(candidates)}), the rest waits for the next run.")
+        return candidates, done_with
+    candidates.extend(pending)
+    return candidates, None
 
-    print(f"Gardener: Analyzing {len(entities)} entities for duplicates...")
 
-    # 2. Ask AI to find duplicates in this list
+async def _find_candidates_since(
+    after: tuple[int, str], until: int
+) -> tuple[list[tuple[str, str]], tuple[int, str]]:
+    """
+    Incremental candidate generation: compares only entities that sort after
+    `after` = (created_at, name) and were created before `until` against the
+    existing graph, through its indexes.
+    Returns (candidates, cursor) where cursor is how far the pass got.
+    """
+    candidates = []
+    seen = set()
+    cursor = after
+    async for page in graph_service.iter_entities_created_since(after, until):
+        page_candidates = []
+        similar = await graph_service.find_similar_entities([name for name, _, _ in page])
+        keys = {name: key for name, key, _ in page}
+        for name, other, other_key in similar:
+            pair = frozenset((name, other))
+            if pair in seen or not other_key:
+                continue
+            if similarity(keys[name], other_key) >= settings.GARDENER_SIMILARITY_THRESHOLD:
+                seen.add(pair)
+                page_candidates.append((other, name))
+
+        if candidates and len(candidates) + len(page_candidates) > settings.GARDENER_MAX_CANDIDATES:
+            print(f"Gardener: Candidate limit reached ({len(candidates)}), the rest waits for the next run.")
+            return candidates, cursor
+        candidates.extend(page_candidates)
+        # Resume after the last entity of this page (created_at is shared by a whole write batch)
+        last_name, _, last_created_at = page[-1]
+        cursor = (last_created_at, last_name)
+    # Names are never empty, so this covers everything created from `until` on
+    return candidates, (until, "")
+
+
+async def _confirm_duplicates(pairs: list[tuple[str, str]]) -> list[tuple[str, str]]:
+    """
+    Asks the AI which candidate pairs refer to the same real-world object.
+    Returns (keep, merge) pairs; answers that aren't one of the candidates are ignored.
+    Raises if the AI did not give a usable answer.
+    """
+    numbered = "\n".join(f"{i + 1}. {a} | {b}" for i, (a, b) in enumerate(pairs))
     prompt = f"""
-    Analyze this list of entities: {entities}
-    Identify pairs that refer to the SAME real-world object but have slightly different spellings or capitalizations.
+    Each line below is a pair of entity names from a knowledge graph:
+    {numbered}
+    
+    Identify the pairs that refer to the SAME real-world object but have slightly different spellings or capitalizations.
     
     Return ONLY a valid JSON list of objects. Format:
     [
@@ -49,48 +119,182 @@ async def prune_graph():
 
     response_text = await llm_service.generate_answer(prompt, context="System Maintenance Mode")
     
-    # 3. Clean and Parse JSON (Robust Logic)
+    # Clean and Parse JSON (Robust Logic)
     try:
         cleaned_text = re.sub(r"```json|```", "", response_text).strip()
         merge_pairs = json.loads(cleaned_text)
         
-    except json.JSONDecodeError:
+    except json.JSONDecodeError as e:
+        # Also what an LLM failure looks like: not the same as "no duplicates"
         print(f"Gardener Error: AI returned invalid JSON.\nRaw: {response_text}")
-        return
+        raise ValueError("Duplicate confirmation returned invalid JSON") from e
 
-    if not merge_pairs:
-        print("Gardener: No duplicates found.")
-        return
+    allowed = {frozenset(pair) for pair in pairs}
+    confirmed = []
+    for pair in merge_pairs or []:
+        keep = pair.get('keep')
+        discard = pair.get('merge')
+        if keep and discard and keep != discard and frozenset((keep, discard)) in allowed:
+            confirmed.append((keep, discard))
+    return confirmed
 
-    print(f"Gardener: Found {len(merge_pairs)} duplicates to merge.")
 
-    # 4. Execute Merges in Neo4j
-    merge_query = """
-    MATCH (keep:Entity {name: $keep_name})
-    MATCH (discard:Entity {name: $discard_name})
-    CALL apoc.refactor.mergeNodes([keep, discard], {properties: 'discard', mergeRels: true})
-    YIELD node
-    RETURN node.name
+def _group_merges(confirmed: list[tuple[str, str]]) -> dict[str, list[str]]:
     """
+    Resolves chains (A <- B, B <- C) so every duplicate is merged straight
+    into one canonical node: {keep: [merge, ...]}.
+    """
+    parent: dict[str, str] = {}
 
-    with graph_service.driver.session() as session:
-        for pair in merge_pairs:
-            keep = pair.get('keep')
-            discard = pair.get('merge')
-            
-            print(f"Merging '{discard}' -> '{keep}'...")
+    def find(name: str) -> str:
+        while parent.get(name, name) != name:
+            name = parent[name]
+        return name
+
+    for keep, discard in confirmed:
+        root_keep, root_discard = find(keep), find(discard)
+        if root_keep != root_discard:
+            parent[root_discard] = root_keep
+
+    groups: dict[str, list[str]] = {}
+    for name in parent:
+        groups.setdefault(find(name), []).append(name)
+    return groups
+
+
+def _full_pass_progress(started: int, stopped_at: tuple[str, str] | None) -> dict:
+    """Job state after a full pass that started at `started` and got to `stopped_at`."""
+    if stopped_at is not None:
+        return {"full_pass_at": started, "full_pass_key": stopped_at[0], "full_pass_name": stopped_at[1]}
+    # Finished: entities created since the pass started are left to incremental runs
+    return {
+        "watermark": started, "watermark_name": "",
+        "full_pass_at": None, "full_pass_key": None, "full_pass_name": None
+    }
+
+
+async def prune_graph(full: bool = False):
+    """
+    Scans the graph for similar entities and merges them.
+    Example: Merges 'Space X' into 'SpaceX'.
+    
+    1. Candidate generation - no LLM. Incremental runs only compare entities
+       created since the last run's watermark; the first run (or full=True)
+       walks the whole graph (entity_matching), over several runs if it hits
+       GARDENER_MAX_CANDIDATES
+    2. The AI confirms candidates in small batches
+    3. Merges run as batched write transactions, then the stored progress
+       advances - only past candidates that were actually confirmed
+
+    Errors are re-raised after logging, so the scheduler records a failed run.
+    """
+    print("Gardener: Starting graph maintenance...")
+
+    # 1. Find likely duplicate pairs
+    try:
+        state, now = await graph_service.get_job_state(PRUNE_JOB)
+        # Only entities whose writes have surely committed (see GARDENER_WATERMARK_LAG_SECONDS)
+        until = now - settings.GARDENER_WATERMARK_LAG_SECONDS * 1000
+        if state.get("full_pass_at") is not None and not full:
+            print("Gardener: Resuming the full pass over the graph.")
+            candidates, stopped_at = await _find_candidates(
+                (state["full_pass_key"], state["full_pass_name"])
+            )
+            progress = _full_pass_progress(state["full_pass_at"], stopped_at)
+        elif full or state.get("watermark") is None:
+            print("Gardener: Full pass over the graph.")
+            backfilled = await graph_service.backfill_entity_keys()
+            if backfilled:
+                print(f"Gardener: Backfilled blocking keys on {backfilled} entities.")
+            candidates, stopped_at = await _find_candidates()
+            progress = _full_pass_progress(until, stopped_at)
+        else:
+            watermark = (state["watermark"], state.get("watermark_name", ""))
+            print(f"Gardener: Incremental pass over entities created since {watermark[0]}.")
+            candidates, cursor = await _find_candidates_since(watermark, until)
+            progress = {"watermark": cursor[0], "watermark_name": cursor[1]}
             
-            try:
-                session.run(merge_query, keep_name=keep, discard_name=discard)
-                
-            except Exception as e:
-                print(f"APOC merge failed (Plugin missing ?).")
+    except Exception as e:
+        print(f"Gardener Error: Could not fetch entities from Graph. {e}")
+        raise
+
+    if not candidates:
+        print("Gardener: No duplicate candidates found.")
+        await graph_service.set_job_state(PRUNE_JOB, **progress)
+        return
+
+    print(f"Gardener: Analyzing {len(candidates)} candidate pairs for duplicates...")
+
+    # 2. Ask AI to confirm duplicates, a small batch at a time
+    confirmed = []
+    failed = None
+    batch_size = settings.GARDENER_LLM_BATCH_SIZE
+    for i in range(0, len(candidates), batch_size):
+        try:
+            confirmed.extend(await _confirm_duplicates(candidates[i:i + batch_size]))
+        except Exception as e:
+            # Merge what was confirmed, but keep the old progress so the rest is retried
+            print(f"Gardener Error: Could not confirm duplicates. {e}")
+            failed = e
+            break
 
+    if not confirmed:
+        if failed is not None:
+            raise failed
+        print("Gardener: No duplicates found.")
+        await graph_service.set_job_state(PRUNE_JOB, **progress)
+        return
+
+    groups = _group_merges(confirmed)
+    print(f"Gardener: Found {len(confirmed)} duplicates to merge into {len(groups)} entities.")
+    for keep, discards in groups.items():
+        print(f"Merging {discards} -> '{keep}'...")
+
+    # 3. Execute Merges in Neo4j
+    try:
+        await graph_service.merge_entities(groups, batch_size=settings.GARDENER_MERGE_BATCH_SIZE)
+    except Exception as e:
+        print(f"APOC merge failed (Plugin missing ?). {e}")
+        raise
+
+    if failed is not None:
+        print("Gardener: Stopped early, the remaining candidates are retried next run.")
+        raise failed
+    await graph_service.set_job_state(PRUNE_JOB, **progress)
     print("Gardener: Graph pruning complete.")
 
-def clean_old_vectors(days_old: int = 365):
+async def _delete_in_batches(client, max_points: int | None = None, **scroll_kwargs) -> int:
     """
-    Deletes Qdrant vectors older than 365 days to save space.
+    Deletes the points a scroll selects, one page at a time, so a large
+    cleanup never turns into a single huge delete. Returns the number deleted.
+    """
+    deleted = 0
+    while max_points is None or deleted < max_points:
+        limit = settings.CACHE_DELETE_BATCH_SIZE
+        if max_points is not None:
+            limit = min(limit, max_points - deleted)
+        # Deleted points drop out of the next scroll, so always read the first page
+        points, _ = await client.scroll(
+            collection_name=COLLECTION_NAME,
+            limit=limit,
+            with_payload=False,
+            with_vectors=False,
+            **scroll_kwargs
+        )
+        if not points:
+            break
+        await client.delete(
+            collection_name=COLLECTION_NAME,
+            points_selector=models.PointIdsList(points=[point.id for point in points]),
+            wait=True
+        )
+        deleted += len(points)
+    return deleted
+
+async def clean_old_vectors(days_old: int = settings.CACHE_TTL_DAYS):
+    """
+    Deletes Qdrant vectors older than CACHE_TTL_DAYS (365 by default) to save space.
+    Uses the timestamp payload index and deletes in batches.
     """
     print(f"Gardener: Cleaning vectors older than {days_old} days...")
     
@@ -110,13 +314,46 @@ def clean_old_vectors(days_old: int = 365):
         )
         
         # Execute deletion
-        result = qdrant_client.delete(
-            collection_name=COLLECTION_NAME,
-            points_selector=models.FilterSelector(
-                filter=time_filter
-            )
+        qdrant_client = await get_qdrant_client()
+        deleted = await _delete_in_batches(qdrant_client, scroll_filter=time_filter)
+        print(f"Gardener: {deleted} old memories deleted.")
+        
+    except Exception as e:
+        print(f"Gardener Error: Failed to clean Qdrant. {e}")
+        raise  # recorded as a failed run by the scheduler
+
+async def evict_cache_entries():
+    """
+    Keeps the semantic cache within CACHE_MAX_POINTS. When over capacity,
+    evicts down to CACHE_EVICTION_TARGET of it, least recently hit (lru)
+    or least often hit (lfu) first.
+    """
+    capacity = settings.CACHE_MAX_POINTS
+    if capacity <= 0:
+        return
+    
+    try:
+        qdrant_client = await get_qdrant_client()
+        total = (await qdrant_client.count(collection_name=COLLECTION_NAME, exact=True)).count
+        if total <= capacity:
+            print(f"Gardener: Cache within capacity ({total}/{capacity}).")
+            return
+        
+        excess = total - int(capacity * settings.CACHE_EVICTION_TARGET)
+        key = "hits" if settings.CACHE_EVICTION_POLICY == "lfu" else "last_hit_at"
+        print(f"Gardener: Cache over capacity ({total}/{capacity}), evicting {excess} entries by {key}...")
+        
+        # Entries saved before hit tracking have no stats - they go first
+        untracked = models.Filter(must=[models.IsEmptyCondition(is_empty=models.PayloadField(key=key))])
+        deleted = await _delete_in_batches(qdrant_client, max_points=excess, scroll_filter=untracked)
+        
+        deleted += await _delete_in_batches(
+            qdrant_client,
+            max_points=excess - deleted,
+            order_by=models.OrderBy(key=key, direction=models.Direction.ASC)
         )
-        print(f"Gardener: Old memories deleted. Status: {result}")
+        print(f"Gardener: Evicted {deleted} cache entries.")
         
     except Exception as e:
-        print(f"Gardener Error: Failed to clean Qdrant. {e}")
\ No newline at end of file
+        print(f"Gardener Error: Failed to evict cache entries. {e}")
+        raise  # recorded as a failed run by the scheduler
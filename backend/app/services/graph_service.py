@@ -1,91 +1,500 @@
-from neo4j import GraphDatabase
+import asyncio
+import re
+from contextlib import asynccontextmanager
+from neo4j import AsyncGraphDatabase, AsyncDriver, AsyncManagedTransaction
+from neo4j.exceptions import ClientError
 from app.core.config import settings
+from app.services.entity_matching import entity_key
 
 # Lazy initialization - don't connect at import time
-_driver = None
+_driver: AsyncDriver | None = None
+_schema_task: asyncio.Task | None = None
 
+FULLTEXT_INDEX = "entity_name_fulltext"
+FULLTEXT_LIMIT = 25  # max partial matches per query entity
 
-def _get_driver():
-    """Lazy load the Neo4j driver."""
-    global _driver
+SCHEMA_STATEMENTS = [
+    # Backs MERGE (:Entity {name}) and makes exact lookups index seeks
+    "CREATE CONSTRAINT entity_name_unique IF NOT EXISTS FOR (e:Entity) REQUIRE e.name IS UNIQUE",
+    # Case-insensitive exact matches
+    "CREATE INDEX entity_name_lower IF NOT EXISTS FOR (e:Entity) ON (e.name_lower)",
+    # Duplicate detection walks entities in blocking-key order (see entity_matching)
+    "CREATE INDEX entity_name_key IF NOT EXISTS FOR (e:Entity) ON (e.name_key)",
+    # Incremental gardener passes only look at entities created since the last run
+    "CREATE INDEX entity_created_at IF NOT EXISTS FOR (e:Entity) ON (e.created_at)",
+    "CREATE CONSTRAINT gardener_state_job IF NOT EXISTS FOR (g:GardenerState) REQUIRE g.job IS UNIQUE",
+    # Partial (token / prefix) matches
+    f"CREATE FULLTEXT INDEX {FULLTEXT_INDEX} IF NOT EXISTS FOR (e:Entity) ON EACH [e.name]",
+]
+
+# Fills name_lower on nodes written before it existed. Must run in an auto-commit transaction.
+BACKFILL_NAME_LOWER = """
+MATCH (e:Entity) WHERE e.name_lower IS NULL
+CALL { WITH e SET e.name_lower = toLower(e.name) } IN TRANSACTIONS OF 10000 ROWS
+"""
+
+
+async def get_driver() -> AsyncDriver:
+    """
+    Lazy load the async Neo4j driver (one connection pool per worker).
+    Creating it does not connect; the schema is set up in the background (see init_driver).
+    """
+    global _driver, _schema_task
     if _driver is None:
         print(f"\n🔌 Connecting to Neo4j at {settings.NEO4J_URI}...")
-        _driver = GraphDatabase.driver(
+        _driver = AsyncGraphDatabase.driver(
             settings.NEO4J_URI,
-            auth=(settings.NEO4J_USERNAME, settings.NEO4J_PASSWORD)
+            auth=(settings.NEO4J_USERNAME, settings.NEO4J_PASSWORD),
+            max_connection_pool_size=settings.NEO4J_MAX_POOL_SIZE,
+            connection_acquisition_timeout=settings.NEO4J_ACQUISITION_TIMEOUT,
+            connection_timeout=settings.NEO4J_CONNECTION_TIMEOUT,
+            max_connection_lifetime=settings.NEO4J_MAX_CONNECTION_LIFETIME
         )
+        _schema_task = asyncio.create_task(_setup_schema(_driver))
+    return _driver
+
+
+async def init_driver():
+    """
+    Startup step: creates the driver and waits up to NEO4J_STARTUP_TIMEOUT for the schema.
+    If Neo4j is not reachable yet, the setup keeps retrying in the background.
+    """
+    await get_driver()
+    done, _ = await asyncio.wait({_schema_task}, timeout=settings.NEO4J_STARTUP_TIMEOUT)
+    if not done:
+        print("⚠️ Warning: Graph schema not ready yet, still retrying in the background")
+
+
+async def _setup_schema(driver: AsyncDriver):
+    """Connects and applies the schema, retrying with backoff until it succeeds."""
+    delay = 1.0
+    while True:
         try:
-            _driver.verify_connectivity()
+            await driver.verify_connectivity()
             print("✅ Connected to Neo4j Graph Database")
+            await _ensure_schema(driver)
+            return
         except Exception as e:
-            print(f"⚠️ Warning: Could not verify Neo4j connection: {e}")
-    return _driver
+            print(f"⚠️ Warning: Could not set up Neo4j, retrying in {delay:.0f}s: {e}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 60.0)
+
+
+async def _ensure_schema(driver: AsyncDriver):
+    """ Creates the Entity constraint and indexes if they don't exist. """
+    async with driver.session(database=settings.NEO4J_DATABASE or None) as s:
+        for statement in SCHEMA_STATEMENTS:
+            try:
+                result = await s.run(statement)
+                await result.consume()
+            except ClientError as e:
+                # e.g. duplicate names written before the constraint existed; retrying won't help
+                print(f"⚠️ Warning: Could not apply graph schema '{statement[:60]}...': {e}")
+        result = await s.run(BACKFILL_NAME_LOWER)
+        summary = await result.consume()
+        if summary.counters.properties_set:
+            print(f"📁 Backfilled name_lower on {summary.counters.properties_set} entities")
+    print("✅ Graph schema ready")
+
+
+@asynccontextmanager
+async def session():
+    """Opens a session on the shared driver's pool."""
+    driver = await get_driver()
+    # Naming the database skips the home-database lookup on every session
+    async with driver.session(database=settings.NEO4J_DATABASE or None) as s:
+        yield s
+
+
+async def _merge_relationships(tx: AsyncManagedTransaction, facts: list[dict]):
+    query = """
+    UNWIND $facts AS fact
+    MERGE (h:Entity {name: fact.head})
+      ON CREATE SET h.name_lower = toLower(fact.head), h.name_key = fact.head_key, h.created_at = timestamp()
+    SET h.updated_at = timestamp()
+    MERGE (t:Entity {name: fact.tail})
+      ON CREATE SET t.name_lower = toLower(fact.tail), t.name_key = fact.tail_key, t.created_at = timestamp()
+    SET t.updated_at = timestamp()
+    MERGE (h)-[r:RELATION {type: fact.type}]->(t)
+      ON CREATE SET r.created_at = timestamp()
+    """
+    result = await tx.run(query, facts=facts)
+    await result.consume()
+
+
+async def add_relationships(facts: list[tuple[str, str, str]]):
+    """
+    Creates many facts in the graph in one write transaction: [(Head, RELATION, Tail), ...]
+    Raises on failure so callers can retry.
+    """
+    unique_facts = list(dict.fromkeys(facts))
+    if not unique_facts:
+        return
+    
+    print(f"\n📊 GRAPH UPDATE ({len(unique_facts)} facts)")
+    for head, relation_type, tail in unique_facts:
+        print(f"   ({head}) -[{relation_type}]-> ({tail})")
+    
+    async with session() as s:
+        await s.execute_write(
+            _merge_relationships,
+            [
+                {
+                    "head": head, "head_key": entity_key(head),
+                    "type": relation_type,
+                    "tail": tail, "tail_key": entity_key(tail)
+                }
+                for head, relation_type, tail in unique_facts
+            ]
+        )
+    print(f"   ✅ Relationships saved to Neo4j")
 
 
-def add_relationship(head: str, relation_type: str, tail: str):
+async def add_relationship(head: str, relation_type: str, tail: str):
     """
     Creates a fact in the graph: (Head)-[RELATION]->(Tail)
     Example: (Elon Musk)-[OWNS]->(SpaceX)
     """
     try:
-        driver = _get_driver()
-        query = """
-        MERGE (h:Entity {name: $head_name})
-        MERGE (t:Entity {name: $tail_name})
-        MERGE (h)-[r:RELATION {type: $rel_type}]->(t)
-        RETURN h, r, t
-        """
-
-        print(f"\n📊 GRAPH UPDATE")
-        print(f"   ({head}) -[{relation_type}]-> ({tail})")
-
-        with driver.session() as session:
-            session.run(query, head_name=head, tail_name=tail, rel_type=relation_type)
-            print(f"   ✅ Relationship saved to Neo4j")
+        await add_relationships([(head, relation_type, tail)])
     except Exception as e:
         print(f"   ⚠️ Failed to add relationship: {e}")
 
 
-def get_entity_facts(entity_name: str):
+class FactWriteBuffer:
     """
-    Finds everything connected to a specific entity.
-    Uses case-insensitive partial matching.
+    Write-behind buffer that combines facts from many conversations into one
+    transaction. Flushes every flush_interval seconds or once max_size facts are queued.
+    """
+
+    def __init__(self, max_size: int, flush_interval: float):
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        self._facts: list[tuple[str, str, str]] = []
+        self._timer: asyncio.Task | None = None
+        self._flush_lock = asyncio.Lock()
+
+    async def add(self, facts: list[tuple[str, str, str]]):
+        self._facts.extend(facts)
+        if len(self._facts) >= self.max_size:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_interval)
+        self._timer = None
+        try:
+            await self.flush()
+        except Exception as e:
+            print(f"   ⚠️ Buffered graph flush failed, will retry: {e}")
+            if self._timer is None:
+                self._timer = asyncio.create_task(self._flush_later())
+
+    async def flush(self):
+        async with self._flush_lock:
+            facts, self._facts = self._facts, []
+            try:
+                await add_relationships(facts)
+            except Exception:
+                # Keep them for the next flush
+                self._facts[:0] = facts
+                raise
+
+    async def close(self):
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        await self.flush()
+
+
+_write_buffer: FactWriteBuffer | None = None
+if settings.GRAPH_WRITE_FLUSH_INTERVAL > 0:
+    _write_buffer = FactWriteBuffer(
+        max_size=settings.GRAPH_WRITE_BUFFER_SIZE,
+        flush_interval=settings.GRAPH_WRITE_FLUSH_INTERVAL
+    )
+
+
+async def write_facts(facts: list[tuple[str, str, str]]):
+    """
+    Saves distilled facts, through the write-behind buffer when enabled,
+    otherwise in a single transaction right away.
+    """
+    if _write_buffer is not None:
+        await _write_buffer.add(facts)
+    else:
+        await add_relationships(facts)
+
+
+def _lucene_escape(text: str) -> str:
+    """Escapes Lucene query syntax so entity names are matched literally."""
+    # One character at a time: "&&" and "||" need both characters escaped
+    return re.sub(r'([+\-!(){}\[\]^"~*?:\\/&|])', r"\\\1", text)
+
+
+async def _read_facts_for_entities(tx: AsyncManagedTransaction, entity_names: list[str]):
+    # Case-insensitive exact match on the name_lower index, plus token/prefix
+    # matches from the full-text index. One query for all entities.
+    query = """
+    UNWIND $terms AS term
+    CALL {
+        WITH term
+        MATCH (e:Entity {name_lower: term.lower})
+        RETURN e
+        UNION
+        WITH term
+        CALL db.index.fulltext.queryNodes($index, term.lucene, {limit: $limit}) YIELD node
+        RETURN node AS e
+    }
+    MATCH (e)-[r]->(target)
+    RETURN term.name as name, e.name as entity, r.type as relation, target.name as target
+    """
+    terms = []
+    for name in entity_names:
+        escaped = _lucene_escape(name.lower())
+        terms.append({"name": name, "lower": name.lower(), "lucene": f"{escaped} OR {escaped}*"})
+    result = await tx.run(query, terms=terms, index=FULLTEXT_INDEX, limit=FULLTEXT_LIMIT)
+    return [record async for record in result]
+
+
+async def get_facts_for_entities(entity_names: list[str]) -> dict[str, list[str]]:
+    """
+    Finds everything connected to any of the given entities in a single round trip.
+    Uses case-insensitive exact and partial (token/prefix) matching through the indexes.
+    Returns {entity: [facts]}; a fact matched by several entities is only listed under the first.
     """
+    names = list(dict.fromkeys(entity_names))
+    if not names:
+        return {}
+    
     try:
-        driver = _get_driver()
-        # Case-insensitive matching using toLower() and CONTAINS
-        query = """
-        MATCH (e:Entity)-[r]->(target)
-        WHERE toLower(e.name) CONTAINS toLower($name)
-        RETURN e.name as entity, r.type as relation, target.name as target
-        """
-        
         print(f"\n🔍 GRAPH LOOKUP")
-        print(f"   Searching for: '{entity_name}' (case-insensitive)")
+        print(f"   Searching for: {names} (case-insensitive)")
+        
+        async with session() as s:
+            records = await s.execute_read(_read_facts_for_entities, names)
         
-        results = []
-        with driver.session() as session:
-            result = session.run(query, name=entity_name)
-            for record in result:
-                fact = f"{record['entity']} {record['relation']} {record['target']}"
-                results.append(fact)
+        order = {name: i for i, name in enumerate(names)}
+        facts_by_entity: dict[str, list[str]] = {}
+        seen = set()
+        for record in sorted(records, key=lambda r: order[r["name"]]):
+            fact = f"{record['entity']} {record['relation']} {record['target']}"
+            if fact in seen:
+                continue
+            seen.add(fact)
+            facts_by_entity.setdefault(record["name"], []).append(fact)
         
-        if results:
-            print(f"   ✅ Found {len(results)} facts:")
-            for fact in results:
-                print(f"   • {fact}")
+        if seen:
+            print(f"   ✅ Found {len(seen)} facts:")
+            for entity, facts in facts_by_entity.items():
+                for fact in facts:
+                    print(f"   • [{entity}] {fact}")
         else:
-            print(f"   No facts found containing '{entity_name}'")
+            print(f"   No facts found for {names}")
         
-        return results
+        return facts_by_entity
     except Exception as e:
         print(f"   ⚠️ Failed to get entity facts: {e}")
+        return {}
+
+
+async def get_entity_facts(entity_name: str):
+    """
+    Finds everything connected to a specific entity.
+    Uses case-insensitive exact and partial (token/prefix) matching through the indexes.
+    """
+    facts_by_entity = await get_facts_for_entities([entity_name])
+    return facts_by_entity.get(entity_name, [])
+
+
+async def backfill_entity_keys(batch_size: int = 5000) -> int:
+    """
+    Sets name_key on entities written before it existed. The key is computed
+    in Python (entity_key), so this pages through them in batches.
+    """
+    total = 0
+    async with session() as s:
+        while True:
+            result = await s.run(
+                "MATCH (e:Entity) WHERE e.name_key IS NULL RETURN e.name AS name LIMIT $limit",
+                limit=batch_size
+            )
+            names = [record["name"] async for record in result]
+            if not names:
+                return total
+            result = await s.run(
+                """
+                UNWIND $rows AS row
+                MATCH (e:Entity {name: row.name})
+                SET e.name_key = row.key
+                """,
+                rows=[{"name": name, "key": entity_key(name)} for name in names]
+            )
+            await result.consume()
+            total += len(names)
+
+
+async def iter_entities_by_key(page_size: int = 5000):
+    """
+    Streams (name, name_key) for every entity in key order, one short read
+    transaction per page (keyset pagination on the name_key index).
+    """
+    query = """
+    MATCH (e:Entity)
+    WHERE e.name_key > $after_key OR (e.name_key = $after_key AND e.name > $after_name)
+    RETURN e.name AS name, e.name_key AS key
+    ORDER BY e.name_key, e.name
+    LIMIT $limit
+    """
+    after_key, after_name = "", ""
+    while True:
+        async with session() as s:
+            result = await s.run(query, after_key=after_key, after_name=after_name, limit=page_size)
+            page = [(record["name"], record["key"]) async for record in result]
+        for row in page:
+            yield row
+        if len(page) < page_size:
+            return
+        after_name, after_key = page[-1]
+
+
+async def get_job_state(job: str) -> tuple[dict, int]:
+    """
+    Returns (state, now): the properties stored for a maintenance job ({} if it
+    has never run) and the database clock in epoch milliseconds.
+    """
+    async with session() as s:
+        result = await s.run(
+            """
+            OPTIONAL MATCH (g:GardenerState {job: $job})
+            RETURN properties(g) AS state, timestamp() AS now
+            """,
+            job=job
+        )
+        record = await result.single()
+    return record["state"] or {}, record["now"]
+
+
+async def set_job_state(job: str, **state):
+    """Updates the properties stored for a maintenance job; None removes one."""
+    async with session() as s:
+        result = await s.run(
+            """
+            MERGE (g:GardenerState {job: $job})
+            SET g += $state, g.updated_at = timestamp()
+            """,
+            job=job, state=state
+        )
+        await result.consume()
+
+
+async def iter_entities_created_since(after: tuple[int, str], until: int, page_size: int = 1000):
+    """
+    Streams pages of (name, name_key, created_at) for entities that sort after
+    `after` = (created_at, name) and were created before `until`, oldest first
+    (keyset pagination on the created_at index). One write stamps a whole batch
+    with the same created_at, so the name breaks ties.
+    """
+    query = """
+    MATCH (e:Entity)
+    WHERE e.created_at < $until
+      AND (e.created_at > $after_ts OR (e.created_at = $after_ts AND e.name > $after_name))
+    RETURN e.name AS name, e.name_key AS key, e.created_at AS created_at
+    ORDER BY e.created_at, e.name
+    LIMIT $limit
+    """
+    after_ts, after_name = after
+    while True:
+        async with session() as s:
+            result = await s.run(
+                query, until=until, after_ts=after_ts, after_name=after_name, limit=page_size
+            )
+            page = [(record["name"], record["key"], record["created_at"]) async for record in result]
+        if page:
+            yield page
+        if len(page) < page_size:
+            return
+        after_name, _, after_ts = page[-1]
+
+
+async def _read_similar_entities(tx: AsyncManagedTransaction, rows: list[dict], limit: int):
+    # Same blocking key (index seek) or a fuzzy full-text hit on the name
+    query = """
+    UNWIND $rows AS row
+    CALL {
+        WITH row
+        MATCH (e:Entity {name_key: row.key})
+        RETURN e
+        UNION
+        WITH row
+        CALL db.index.fulltext.queryNodes($index, row.fuzzy, {limit: $limit}) YIELD node
+        RETURN node AS e
+    }
+    WITH row, e WHERE e.name <> row.name
+    RETURN row.name AS name, e.name AS other, e.name_key AS other_key
+    """
+    result = await tx.run(query, rows=rows, index=FULLTEXT_INDEX, limit=limit)
+    return [(record["name"], record["other"], record["other_key"]) async for record in result]
+
+
+async def find_similar_entities(names: list[str], limit: int = 10) -> list[tuple[str, str, str]]:
+    """
+    Looks up existing entities that might duplicate each of `names`, through the
+    name_key and full-text indexes. Returns (name, other_name, other_key) rows.
+    """
+    rows = []
+    for name in names:
+        tokens = [_lucene_escape(token) for token in name.lower().split()]
+        if not tokens:
+            continue
+        rows.append({
+            "name": name,
+            "key": entity_key(name),
+            "fuzzy": " OR ".join(f"{token}~" for token in tokens)
+        })
+    if not rows:
         return []
+    async with session() as s:
+        return await s.execute_read(_read_similar_entities, rows, limit)
+
+
+async def _merge_entity_groups(tx: AsyncManagedTransaction, groups: list[dict]):
+    query = """
+    UNWIND $groups AS group
+    MATCH (keep:Entity {name: group.keep})
+    MATCH (discard:Entity) WHERE discard.name IN group.merge
+    WITH keep, collect(discard) AS discards
+    CALL apoc.refactor.mergeNodes([keep] + discards, {properties: 'discard', mergeRels: true})
+    YIELD node
+    RETURN count(node) AS merged
+    """
+    result = await tx.run(query, groups=groups)
+    await result.consume()
 
 
-def close_driver():
-    global _driver
+async def merge_entities(groups: dict[str, list[str]], batch_size: int = 100):
+    """
+    Merges duplicate entities into their canonical node: {keep: [merge, ...]}.
+    Each batch of groups is one write transaction. Requires the APOC plugin.
+    """
+    items = [{"keep": keep, "merge": merge} for keep, merge in groups.items() if merge]
+    for i in range(0, len(items), batch_size):
+        async with session() as s:
+            await s.execute_write(_merge_entity_groups, items[i:i + batch_size])
+
+
+async def close_driver():
+    global _driver, _schema_task
+    if _schema_task is not None:
+        _schema_task.cancel()
+        _schema_task = None
+    if _write_buffer is not None:
+        try:
+            await _write_buffer.close()
+        except Exception as e:
+            print(f"   ⚠️ Failed to flush buffered facts: {e}")
     if _driver:
-        _driver.close()
+        await _driver.close()
         _driver = None
-        print("🔌 Neo4j connection closed")
\ No newline at end of file
+        print("🔌 Neo4j connection closed")
@@ -0,0 +1,261 @@
+"""
+Job Queue
+Runs cache writes and distillation outside the request path, with bounded
+concurrency and retries with exponential backoff.
+
+Backends (JOB_QUEUE_BACKEND):
+  local    - in-process asyncio queue drained by the API worker itself
+  postgres - durable `jobs` table drained by `python -m app.workers`
+"""
+import asyncio
+import traceback
+from datetime import timedelta
+from sqlalchemy import select, update, delete, or_, and_, func
+from app.core.config import settings
+from app.database import async_session_maker
+from app.models import Job
+
+
+def _handlers():
+    """Job kind -> coroutine function. Imported lazily to avoid import cycles."""
+    from app.services import memory_service, distiller
+    return {
+        "save_to_cache": memory_service.save_to_cache,
+        "distill_conversation": distiller.distill_conversation,
+    }
+
+
+def _backoff(attempts: int) -> float:
+    return settings.JOB_RETRY_BACKOFF * (2 ** (attempts - 1))
+
+
+async def _run_handler(kind: str, payload: dict):
+    handler = _handlers().get(kind)
+    if handler is None:
+        raise ValueError(f"Unknown job kind '{kind}'")
+    await handler(**payload)
+
+
+class LocalJobQueue:
+    """In-process queue. Not durable: pending jobs are lost if the process exits."""
+
+    def __init__(self, concurrency: int, max_attempts: int):
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self._queue: asyncio.Queue | None = None
+        self._consumers: list[asyncio.Task] = []
+        self._retries: set[asyncio.Task] = set()
+        self.running = 0
+        self.succeeded = 0
+        self.retried = 0
+        self.failed = 0
+
+    async def start(self):
+        if self._consumers:
+            return
+        self._queue = asyncio.Queue()
+        self._consumers = [
+            asyncio.create_task(self._consume()) for _ in range(self.concurrency)
+        ]
+
+    async def stop(self):
+        for task in [*self._consumers, *self._retries]:
+            task.cancel()
+        self._consumers = []
+        self._retries.clear()
+
+    async def enqueue(self, kind: str, **payload):
+        await self.start()
+        self._queue.put_nowait((kind, payload, 1))
+
+    async def _consume(self):
+        while True:
+            kind, payload, attempt = await self._queue.get()
+            self.running += 1
+            try:
+                await _run_handler(kind, payload)
+                self.succeeded += 1
+            except Exception as e:
+                self._retry_or_fail(kind, payload, attempt, e)
+            finally:
+                self.running -= 1
+                self._queue.task_done()
+
+    def _retry_or_fail(self, kind: str, payload: dict, attempt: int, error: Exception):
+        if attempt >= self.max_attempts:
+            self.failed += 1
+            print(f"❌ Job '{kind}' failed after {attempt} attempts: {error}")
+            return
+        self.retried += 1
+        delay = _backoff(attempt)
+        print(f"⚠️ Job '{kind}' attempt {attempt} failed, retrying in {delay:.1f}s: {error}")
+
+        async def requeue():
+            await asyncio.sleep(delay)
+            self._queue.put_nowait((kind, payload, attempt + 1))
+
+        task = asyncio.create_task(requeue())
+        self._retries.add(task)
+        task.add_done_callback(self._retries.discard)
+
+    async def stats(self) -> dict:
+        return {
+            "backend": "local",
+            "pending": self._queue.qsize() if self._queue else 0,
+            "scheduled_retries": len(self._retries),
+            "running": self.running,
+            "succeeded": self.succeeded,
+            "retried": self.retried,
+            "failed": self.failed,
+        }
+
+
+class PostgresJobQueue:
+    """Durable queue on the `jobs` table. Workers claim rows with FOR UPDATE SKIP LOCKED."""
+
+    def __init__(self, max_attempts: int):
+        self.max_attempts = max_attempts
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def enqueue(self, kind: str, **payload):
+        async with async_session_maker() as session:
+            session.add(Job(kind=kind, payload=payload, max_attempts=self.max_attempts))
+            await session.commit()
+
+    async def claim(self) -> Job | None:
+        """
+        Atomically takes the next due job. Jobs left 'running' by a dead worker
+        become claimable again after JOB_VISIBILITY_TIMEOUT; live workers keep
+        theirs fresh with a heartbeat.
+        """
+        stale_before = func.now() - timedelta(seconds=settings.JOB_VISIBILITY_TIMEOUT)
+        next_job = (
+            select(Job.id)
+            .where(or_(
+                and_(Job.status == "pending", Job.run_at <= func.now()),
+                and_(Job.status == "running", Job.updated_at < stale_before),
+            ))
+            .order_by(Job.run_at)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        async with async_session_maker() as session:
+            result = await session.execute(
+                update(Job)
+                .where(Job.id == next_job)
+                .values(status="running", attempts=Job.attempts + 1, updated_at=func.now())
+                .returning(Job)
+                .execution_options(synchronize_session=False)
+            )
+            job = result.scalar_one_or_none()
+            await session.commit()
+            return job
+
+    @staticmethod
+    def _owned(job: Job):
+        """
+        Matches the job row only while it is still this worker's claim. A claim that
+        outlived JOB_VISIBILITY_TIMEOUT may have been taken over (attempts went up).
+        """
+        return and_(Job.id == job.id, Job.status == "running", Job.attempts == job.attempts)
+
+    async def _heartbeat(self, job: Job):
+        """Keeps updated_at fresh while the handler runs, so the claim does not go stale."""
+        interval = settings.JOB_VISIBILITY_TIMEOUT / 3
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                async with async_session_maker() as session:
+                    result = await session.execute(
+                        update(Job).where(self._owned(job)).values(updated_at=func.now())
+                    )
+                    await session.commit()
+                if result.rowcount == 0:
+                    print(f"⚠️ Job {job.id} '{job.kind}' was claimed by another worker")
+                    return
+            except Exception as e:
+                print(f"⚠️ Job {job.id} heartbeat failed: {e}")
+
+    async def complete(self, job: Job):
+        async with async_session_maker() as session:
+            result = await session.execute(delete(Job).where(self._owned(job)))
+            await session.commit()
+        if result.rowcount == 0:
+            print(f"⚠️ Job {job.id} '{job.kind}' finished after losing its claim, left to its new owner")
+
+    async def fail(self, job: Job, error: Exception):
+        message = "".join(traceback.format_exception_only(error)).strip()
+        if job.attempts >= job.max_attempts:
+            values = {"status": "failed", "last_error": message}
+            print(f"❌ Job {job.id} '{job.kind}' failed after {job.attempts} attempts: {error}")
+        else:
+            delay = _backoff(job.attempts)
+            values = {
+                "status": "pending",
+                "last_error": message,
+                "run_at": func.now() + timedelta(seconds=delay),
+            }
+            print(f"⚠️ Job {job.id} '{job.kind}' attempt {job.attempts} failed, retrying in {delay:.1f}s: {error}")
+        async with async_session_maker() as session:
+            result = await session.execute(update(Job).where(self._owned(job)).values(**values))
+            await session.commit()
+        if result.rowcount == 0:
+            print(f"⚠️ Job {job.id} '{job.kind}' failed after losing its claim, left to its new owner")
+
+    async def process_one(self) -> bool:
+        """Claims and runs a single job. Returns False if nothing was due."""
+        job = await self.claim()
+        if job is None:
+            return False
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            await _run_handler(job.kind, job.payload)
+        except Exception as e:
+            error = e
+        else:
+            error = None
+        finally:
+            heartbeat.cancel()
+        if error is None:
+            await self.complete(job)
+        else:
+            await self.fail(job, error)
+        return True
+
+    async def stats(self) -> dict:
+        async with async_session_maker() as session:
+            result = await session.execute(
+                select(Job.status, func.count()).group_by(Job.status)
+            )
+            counts = dict(result.all())
+            oldest = await session.scalar(
+                select(func.extract("epoch", func.now() - func.min(Job.run_at)))
+                .where(Job.status == "pending", Job.run_at <= func.now())
+            )
+        return {
+            "backend": "postgres",
+            "pending": counts.get("pending", 0),
+            "running": counts.get("running", 0),
+            "failed": counts.get("failed", 0),
+            "oldest_pending_seconds": float(oldest) if oldest is not None else 0.0,
+        }
+
+
+if settings.JOB_QUEUE_BACKEND == "postgres":
+    job_queue = PostgresJobQueue(max_attempts=settings.JOB_MAX_ATTEMPTS)
+else:
+    job_queue = LocalJobQueue(
+        concurrency=settings.JOB_WORKER_CONCURRENCY,
+        max_attempts=settings.JOB_MAX_ATTEMPTS
+    )
+
+
+async def enqueue(kind: str, **payload):
+    """Schedules a background job. Payload must be JSON-serializable."""
+    await job_queue.enqueue(kind, **payload)
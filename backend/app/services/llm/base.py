@@ -1,17 +1,26 @@
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any
+from typing import List, Dict, Any, AsyncIterator
 
 class LLMProvider(ABC):
     """
     The Interface: Every AI provider must implement these methods.
     """
-    
+
     @abstractmethod
     async def generate_answer(self, query: str, context: str = "") -> str:
         """Generates a text response based on query and context."""
         pass
 
+    @abstractmethod
+    def stream_answer(self, query: str, context: str = "") -> AsyncIterator[str]:
+        """Yields the response token by token as the model produces it. Raises if the model fails."""
+        pass
+
     @abstractmethod
     async def extract_facts(self, text: str) -> List[Dict[str, Any]]:
-        """Extracts structured facts (Head-Relation-Tail) from text."""
-        pass    
+        """Extracts structured facts (Head-Relation-Tail) from text. Raises if the model call fails."""
+        pass
+
+    async def aclose(self):
+        """Releases pooled connections. Called on application shutdown."""
+        pass
@@ -1,22 +1,25 @@
 import json
-from groq import Groq
+import httpx
+from groq import AsyncGroq
 from app.core.config import settings
 from .base import LLMProvider
-
-client = Groq(
-    api_key=settings.GROQ_API_KEY,
-)
+from .http import build_limits, build_timeout
 
 class GroqProvider(LLMProvider):
     def __init__(self):
         print(f"Initializing Cloud AI (Groq: {settings.GROQ_MODEL})")
-        self.client = Groq(
+        self.client = AsyncGroq(
             api_key=settings.GROQ_API_KEY,
+            timeout=build_timeout(),
+            http_client=httpx.AsyncClient(
+                limits=build_limits(),
+                timeout=build_timeout()
+            )
         )
         
-    async def generate_answer(self, query: str, context: str = "") -> str:
+    def _build_messages(self, query: str, context: str = ""):
         """
-        Sends the user query + any retrieved context to the AI.
+        Builds the chat messages for a user query + any retrieved context.
         """
 
         system_instruction = """
@@ -35,10 +38,18 @@ class GroqProvider(LLMProvider):
                 "content": f"Context: {context}\n\nQuestion: {query}"
             }
         ]
+        return message
+
+    async def generate_answer(self, query: str, context: str = "") -> str:
+        """
+        Sends the user query + any retrieved context to the AI.
+        """
+
+        message = self._build_messages(query, context)
 
         try:
             print(f"🚀 Calling Groq API with query: {query[:50]}...")
-            chat_completion = client.chat.completions.create(
+            chat_completion = await self.client.chat.completions.create(
                 messages=message,
                 model=settings.GROQ_MODEL,
                 temperature= 0.7
@@ -51,6 +62,32 @@ class GroqProvider(LLMProvider):
             print(f"❌ Groq API Error : {e}")
             return "I'm sorry, my brain is offline right now."
 
+    async def stream_answer(self, query: str, context: str = ""):
+        """
+        Same as generate_answer, but yields tokens as Groq streams them.
+        """
+
+        message = self._build_messages(query, context)
+
+        try:
+            print(f"🚀 Streaming from Groq API with query: {query[:50]}...")
+            stream = await self.client.chat.completions.create(
+                messages=message,
+                model=settings.GROQ_MODEL,
+                temperature=0.7,
+                stream=True
+            )
+            async for chunk in stream:
+                token = chunk.choices[0].delta.content if chunk.choices else None
+                if token:
+                    yield token
+            print("✅ Groq stream complete")
+
+        except Exception as e:
+            # Raise instead of yielding an apology: the tokens so far are not an answer
+            print(f"❌ Groq API Error : {e}")
+            raise
+
     async def extract_facts(self, text: str):
         """
         Reads text and extracts entities/relationships as JSON.
@@ -65,20 +102,24 @@ class GroqProvider(LLMProvider):
         Do not add any markown formatting like ```json. Just raw JSON.
         """
 
-        try:
-            response = client.chat.completions.create(
-                messages= [
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                model=settings.GROQ_MODEL,
-                temperature=0.0
-            )
+        # API errors propagate so the distillation job is retried
+        response = await self.client.chat.completions.create(
+            messages= [
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            model=settings.GROQ_MODEL,
+            temperature=0.0
+        )
 
+        try:
             return json.loads(response.choices[0].message.content)
 
-        except Exception as e:
+        except json.JSONDecodeError as e:
             print(f"Fact Extraction Error: {e}")
-            return []
\ No newline at end of file
+            return []
+
+    async def aclose(self):
+        await self.client.close()
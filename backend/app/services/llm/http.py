@@ -0,0 +1,21 @@
+import httpx
+from app.core.config import settings
+
+
+def build_limits() -> httpx.Limits:
+    """Bounded keep-alive pool shared by all in-flight LLM calls on this worker."""
+    return httpx.Limits(
+        max_connections=settings.LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY
+    )
+
+
+def build_timeout() -> httpx.Timeout:
+    """Connect/read/pool timeouts for LLM calls. Read covers the gap between streamed chunks."""
+    return httpx.Timeout(
+        connect=settings.LLM_CONNECT_TIMEOUT,
+        read=settings.LLM_READ_TIMEOUT,
+        write=settings.LLM_CONNECT_TIMEOUT,
+        pool=settings.LLM_POOL_TIMEOUT
+    )
@@ -1,15 +1,24 @@
 import json
+from urllib.parse import urlsplit
 import ollama
 from app.core.config import settings
 from .base import LLMProvider
+from .http import build_limits, build_timeout
 
 class OllamaProvider(LLMProvider):
     def __init__(self):
         print(f"Initializing Local AI (Ollama: {settings.OLLAMA_MODEL})")
+        # OLLAMA_URL may point at an endpoint (e.g. /api/generate); the client wants the host
+        url = urlsplit(settings.OLLAMA_URL)
+        self.client = ollama.AsyncClient(
+            host=f"{url.scheme}://{url.netloc}",
+            timeout=build_timeout(),
+            limits=build_limits()
+        )
 
-    async def generate_answer(self, query: str, context: str = "") -> str:
+    def _build_messages(self, query: str, context: str = ""):
         """
-        Sends the user query + any retrieved context to the AI.
+        Builds the chat messages for a user query + any retrieved context.
         """
         
         system_instruction = """
@@ -27,19 +36,30 @@ class OllamaProvider(LLMProvider):
                 "role": "user",
                 "content": f"Context: {context}\n\nQuestion: {query}"
             }
-        ]   
+        ]
+        return messages
+
+    def _log_request(self, query: str, context: str = ""):
+        print(f"\n🧠 Sending to Ollama ({settings.OLLAMA_MODEL})...")
+        print(f"   Query: {query[:100]}...")
+        if context:
+            print(f"   📋 Context from Graph ({len(context)} chars):")
+            for line in context.strip().split('\n')[:5]:  # Show first 5 facts
+                print(f"      • {line[:80]}")
+            if context.count('\n') > 5:
+                print(f"      ... and {context.count(chr(10)) - 5} more facts")
+
+    async def generate_answer(self, query: str, context: str = "") -> str:
+        """
+        Sends the user query + any retrieved context to the AI.
+        """
+        
+        messages = self._build_messages(query, context)
              
         try:
-            print(f"\n🧠 Sending to Ollama ({settings.OLLAMA_MODEL})...")
-            print(f"   Query: {query[:100]}...")
-            if context:
-                print(f"   📋 Context from Graph ({len(context)} chars):")
-                for line in context.strip().split('\n')[:5]:  # Show first 5 facts
-                    print(f"      • {line[:80]}")
-                if context.count('\n') > 5:
-                    print(f"      ... and {context.count(chr(10)) - 5} more facts")
+            self._log_request(query, context)
             
-            response = ollama.chat(
+            response = await self.client.chat(
                 model=settings.OLLAMA_MODEL,
                 messages=messages,
                 options={
@@ -65,6 +85,46 @@ class OllamaProvider(LLMProvider):
             print(f"Ollama Error: {e}")
             return "My local brain is offline. Is Ollama running?"
 
+    async def stream_answer(self, query: str, context: str = ""):
+        """
+        Same as generate_answer, but yields content tokens as Ollama streams them.
+        Thinking tokens are collected for logging only.
+        """
+        
+        messages = self._build_messages(query, context)
+        
+        try:
+            self._log_request(query, context)
+            
+            stream = await self.client.chat(
+                model=settings.OLLAMA_MODEL,
+                messages=messages,
+                options={
+                    "temperature": 0.7, 
+                    "num_ctx": 4096
+                },
+                think=True,  # Enable thinking mode for qwen3
+                stream=True
+            )
+            
+            thinking = []
+            async for chunk in stream:
+                message = chunk.get('message', {})
+                if message.get('thinking'):
+                    thinking.append(message['thinking'])
+                if message.get('content'):
+                    yield message['content']
+            
+            if thinking:
+                print(f"\n💭 Model Thinking:\n{''.join(thinking)}")
+            
+            print("\n✅ Ollama stream complete")
+        
+        except Exception as e:
+            # Raise instead of yielding an apology: the tokens so far are not an answer
+            print(f"Ollama Error: {e}")
+            raise
+
     async def extract_facts(self, text: str):
         """
         Reads text and extracts entities/relationships as JSON.
@@ -79,22 +139,27 @@ class OllamaProvider(LLMProvider):
         Do not add any markown formatting like ```json. Just raw JSON.
         """
         
-        try:
-            response = ollama.chat(
-                model=settings.OLLAMA_MODEL,
-                messages=[
-                    {
-                        "role": "user", 
-                        "content": prompt
-                    }
-                ],
-                options={
-                    "temperature": 0.0
+        # Ollama errors propagate so the distillation job is retried
+        response = await self.client.chat(
+            model=settings.OLLAMA_MODEL,
+            messages=[
+                {
+                    "role": "user", 
+                    "content": prompt
                 }
-            )
-            
+            ],
+            options={
+                "temperature": 0.0
+            }
+        )
+        
+        try:
             return json.loads(response['message']['content'])
         
-        except Exception as e:
+        except json.JSONDecodeError as e:
             print(f"Local Fact Extraction Error: {e}")
-            return []
\ No newline at end of file
+            return []
+
+    async def aclose(self):
+        # ollama.AsyncClient has no public close(); it owns the underlying httpx client
+        await self.client._client.aclose()
@@ -1,81 +1,293 @@
-from sentence_transformers import SentenceTransformer
-from qdrant_client import QdrantClient
-from qdrant_client.models import PointStruct
+from qdrant_client import AsyncQdrantClient, models
+from qdrant_client.models import Distance, PointStruct, VectorParams
 from dotenv import load_dotenv
 from app.core.config import settings
+from app.services.embedding_service import embed, normalize_query, embedding_cache
+from app.services.answer_cache import answer_cache
+import asyncio
 import time
+import uuid
 
 load_dotenv()
 
 # Lazy initialization - don't connect at import time
-_client = None
-_embedder = None
+_client: AsyncQdrantClient | None = None
+_setup_task: asyncio.Task | None = None
 
 COLLECTION_NAME = "universal_history"
 
-def _get_embedder():
-    """Lazy load the sentence transformer model."""
-    global _embedder
-    if _embedder is None:
-        print("📦 Loading sentence transformer model...")
-        _embedder = SentenceTransformer("all-MiniLM-L6-v2")
-        print("✅ Model loaded: all-MiniLM-L6-v2")
-    return _embedder
-
-def _get_client():
-    """Lazy load the Qdrant client."""
-    global _client
+# Namespace for content-addressed point ids (see point_id)
+POINT_ID_NAMESPACE = uuid.UUID("6f0c1b9e-2d4a-5c3e-9b71-4a8e0d2f6c15")
+
+# Partition for entries with no owner: saved without a user_id, or before partitioning existed
+GLOBAL_TENANT = "global"
+
+# Indexed payload fields: tenant partitioning, TTL cleanup and eviction (see gardener)
+PAYLOAD_INDEXES = {
+    "user_id": models.KeywordIndexParams(type=models.KeywordIndexType.KEYWORD, is_tenant=True),
+    "timestamp": models.PayloadSchemaType.FLOAT,
+    "hits": models.PayloadSchemaType.INTEGER,
+    "last_hit_at": models.PayloadSchemaType.FLOAT,
+}
+
+# Semantic (L2) lookups that got past the L1 answer cache
+l2_hits = 0
+l2_misses = 0
+
+# Hits not yet written to Qdrant: point id -> (count, last hit time). See _count_hit
+_pending_hits: dict[str, tuple[int, float]] = {}
+_hit_flush: asyncio.Task | None = None
+
+async def get_client() -> AsyncQdrantClient:
+    """
+    Lazy load the shared async Qdrant client (one connection pool per worker).
+    Creating it does not connect; the collection is set up in the background (see init_client).
+    """
+    global _client, _setup_task
     if _client is None:
-        print(f"🔌 Connecting to Qdrant at {settings.QDRANT_URL}...")
-        _client = QdrantClient(
+        transport = "gRPC" if settings.QDRANT_PREFER_GRPC else "REST"
+        print(f"🔌 Connecting to Qdrant at {settings.QDRANT_URL} ({transport})...")
+        _client = AsyncQdrantClient(
             url=settings.QDRANT_URL,
-            api_key=settings.QDRANT_API_KEY if settings.QDRANT_API_KEY else None
+            api_key=settings.QDRANT_API_KEY if settings.QDRANT_API_KEY else None,
+            prefer_grpc=settings.QDRANT_PREFER_GRPC,
+            grpc_port=settings.QDRANT_GRPC_PORT,
+            timeout=settings.QDRANT_TIMEOUT
         )
-        _initialize_collection()
+        _setup_task = asyncio.create_task(_setup_collection(_client))
     return _client
 
-def _initialize_collection():
-    """ Creates the collection in Qdrant if it doesn't exist. """
-    global _client
+async def init_client():
+    """
+    Startup step: creates the client and waits up to QDRANT_STARTUP_TIMEOUT for the
+    collection, so cache lookups never pay for the setup. If Qdrant is not reachable
+    yet, the setup keeps retrying in the background.
+    """
+    await get_client()
+    done, _ = await asyncio.wait({_setup_task}, timeout=settings.QDRANT_STARTUP_TIMEOUT)
+    if not done:
+        print("⚠️ Warning: Qdrant collection not ready yet, still retrying in the background")
+
+async def _setup_collection(client: AsyncQdrantClient):
+    """Creates or migrates the collection, retrying with backoff until it succeeds."""
+    delay = 1.0
+    while True:
+        try:
+            await _initialize_collection(client)
+            return
+        except Exception as e:
+            print(f"⚠️ Warning: Could not set up Qdrant, retrying in {delay:.0f}s: {e}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 60.0)
+
+def _quantization_config():
+    """Quantization requested in Settings, or None for full-precision only."""
+    if settings.QDRANT_QUANTIZATION == "scalar":
+        return models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(
+                type=models.ScalarType.INT8,
+                quantile=0.99,
+                always_ram=settings.QDRANT_QUANTIZATION_ALWAYS_RAM
+            )
+        )
+    if settings.QDRANT_QUANTIZATION == "binary":
+        return models.BinaryQuantization(
+            binary=models.BinaryQuantizationConfig(
+                always_ram=settings.QDRANT_QUANTIZATION_ALWAYS_RAM
+            )
+        )
+    return None
+
+def _hnsw_config():
+    return models.HnswConfigDiff(
+        m=settings.QDRANT_HNSW_M,
+        ef_construct=settings.QDRANT_HNSW_EF_CONSTRUCT,
+        payload_m=settings.QDRANT_HNSW_PAYLOAD_M
+    )
+
+def _search_params():
+    """Search-time HNSW ef and quantization rescoring."""
+    quantization = None
+    if _quantization_config() is not None:
+        quantization = models.QuantizationSearchParams(
+            rescore=settings.QDRANT_QUANTIZATION_RESCORE,
+            oversampling=settings.QDRANT_QUANTIZATION_OVERSAMPLING
+        )
+    return models.SearchParams(hnsw_ef=settings.QDRANT_HNSW_EF, quantization=quantization)
+
+def _same_quantization(current, wanted) -> bool:
+    if current is None or wanted is None:
+        return current is None and wanted is None
+    if type(current) is not type(wanted):
+        return False
+    if isinstance(wanted, models.ScalarQuantization):
+        return current.scalar.always_ram == wanted.scalar.always_ram
+    return current.binary.always_ram == wanted.binary.always_ram
+
+async def _migrate_collection(client: AsyncQdrantClient, info):
+    """
+    Brings an existing collection in line with Settings (quantization,
+    on-disk vectors, HNSW params). Qdrant rebuilds in the background; search keeps working.
+    """
+    changes = {}
+    vectors = info.config.params.vectors
+    if bool(vectors.on_disk) != settings.QDRANT_ON_DISK_VECTORS:
+        changes["vectors_config"] = {"": models.VectorParamsDiff(on_disk=settings.QDRANT_ON_DISK_VECTORS)}
+
+    hnsw = info.config.hnsw_config
+    if hnsw.m != settings.QDRANT_HNSW_M or hnsw.ef_construct != settings.QDRANT_HNSW_EF_CONSTRUCT \
+            or hnsw.payload_m != settings.QDRANT_HNSW_PAYLOAD_M:
+        changes["hnsw_config"] = _hnsw_config()
+
+    wanted = _quantization_config()
+    if not _same_quantization(info.config.quantization_config, wanted):
+        changes["quantization_config"] = wanted if wanted is not None else models.Disabled.DISABLED
+
+    if changes:
+        print(f"🔧 Migrating Qdrant Collection {COLLECTION_NAME}: {', '.join(changes)}")
+        await client.update_collection(collection_name=COLLECTION_NAME, **changes)
+
+def _tenant(user_id: int | None) -> str:
+    return str(user_id) if user_id is not None else GLOBAL_TENANT
+
+def _tenant_filter(tenant: str) -> models.Filter:
+    return models.Filter(must=[models.FieldCondition(key="user_id", match=models.MatchValue(value=tenant))])
+
+def point_id(query: str, tenant: str) -> str:
+    """
+    Deterministic id for a cached question: UUIDv5 of the tenant and the
+    normalized query. Saving the same question twice upserts the same point.
+    """
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, f"{tenant}:{normalize_query(query)}"))
+
+async def _ensure_payload_indexes(client: AsyncQdrantClient, existing: dict):
+    for field, schema in PAYLOAD_INDEXES.items():
+        if field not in existing:
+            await client.create_payload_index(
+                collection_name=COLLECTION_NAME,
+                field_name=field,
+                field_schema=schema
+            )
+            print(f"📁 Created payload index: {field}")
+
+async def _initialize_collection(client: AsyncQdrantClient):
+    """ Creates the collection in Qdrant if it doesn't exist, or migrates its config. """
     try:
-        _client.get_collection(collection_name=COLLECTION_NAME)
+        info = await client.get_collection(collection_name=COLLECTION_NAME)
         print(f"✅ Connected to Qdrant Collection: {COLLECTION_NAME}")
     except Exception:
-        _client.create_collection(
+        await client.create_collection(
             collection_name=COLLECTION_NAME,
-            vectors_config={
-                "size": 384,
-                "distance": "Cosine"
-            })
+            vectors_config=VectorParams(
+                size=384,
+                distance=Distance.COSINE,
+                on_disk=settings.QDRANT_ON_DISK_VECTORS
+            ),
+            hnsw_config=_hnsw_config(),
+            quantization_config=_quantization_config()
+        )
         print(f"📁 Created Qdrant Collection: {COLLECTION_NAME}")
+        await _ensure_payload_indexes(client, {})
+        return
+    await _migrate_collection(client, info)
+    await _ensure_payload_indexes(client, info.payload_schema or {})
+    await _move_unowned_entries(client)
+
+async def _move_unowned_entries(client: AsyncQdrantClient):
+    """
+    Entries saved before partitioning have no owner - moves them to the shared tier,
+    a batch at a time. Runs on every start, so an interrupted move is picked up again;
+    once nothing is left it costs a single empty scroll.
+    """
+    unowned = models.Filter(must=[models.IsEmptyCondition(is_empty=models.PayloadField(key="user_id"))])
+    moved = 0
+    while True:
+        points, _ = await client.scroll(
+            collection_name=COLLECTION_NAME,
+            scroll_filter=unowned,
+            limit=settings.CACHE_DELETE_BATCH_SIZE,
+            with_payload=False,
+            with_vectors=False
+        )
+        if not points:
+            break
+        await client.set_payload(
+            collection_name=COLLECTION_NAME,
+            payload={"user_id": GLOBAL_TENANT},
+            points=[point.id for point in points],
+            wait=True
+        )
+        moved += len(points)
+    if moved:
+        print(f"📁 Moved {moved} unowned cache entries to the '{GLOBAL_TENANT}' partition")
+
+async def close_client():
+    global _client, _setup_task, _hit_flush
+    if _setup_task is not None:
+        _setup_task.cancel()
+        _setup_task = None
+    if _hit_flush is not None:
+        _hit_flush.cancel()
+        _hit_flush = None
+    await _flush_hits()
+    if _client:
+        await _client.close()
+        _client = None
+        print("🔌 Qdrant connection closed")
         
-def check_cache(query: str):
+async def check_cache(query: str, user_id: int | None = None):
     """
-    Searches Memory for a similar question.
+    Looks the question up in the in-process exact-match cache (L1), then
+    searches Memory (L2) for a similar question in the user's own partition
+    (and the shared global partition when CACHE_SHARED_TIER is on).
     Returns the answer if similarity > threshold.
     """
+    global l2_hits, l2_misses
+    tenant = _tenant(user_id)
+    l1_entry = answer_cache.get(query, tenant)
+    if l1_entry is not None:
+        cached_answer, hit_point = l1_entry
+        print(f"\n⚡ L1 CACHE HIT: '{query[:80]}...'")
+        if hit_point is not None:
+            _count_hit(hit_point)
+        return cached_answer
+    
     try:
-        client = _get_client()
-        embedder = _get_embedder()
+        client = await get_client()
         
         print(f"\n🔍 MEMORY CHECK")
         print(f"   Query: '{query[:80]}...'")
+        print(f"   Tenant: {tenant}")
         print(f"   Threshold: {settings.THRESHOLD}")
         
-        # converts text to number vector of size 384 numbers
-        vector = embedder.encode(query).tolist()
+        # converts text to number vector of size 384 numbers (batched off the event loop)
+        vector = await embed(query)
         
-        # searches Qdrant for similar vectors
-        result = client.query_points(
+        # searches Qdrant for similar vectors, one search per tier in a single request
+        tiers = [tenant]
+        if settings.CACHE_SHARED_TIER and tenant != GLOBAL_TENANT:
+            tiers.append(GLOBAL_TENANT)
+        responses = await client.query_batch_points(
             collection_name=COLLECTION_NAME,
-            query=vector,
-            limit=3  # Get top 3 for logging
+            requests=[
+                models.QueryRequest(
+                    query=vector,
+                    filter=_tenant_filter(tier),
+                    limit=3,  # Get top 3 for logging
+                    params=_search_params(),
+                    with_payload=True
+                )
+                for tier in tiers
+            ],
+            timeout=settings.QDRANT_SEARCH_TIMEOUT
         )
-        hits = result.points if result else []
-        
-        print(f"   Found {len(hits)} potential matches")
         
-        if hits:
+        for tier, response in zip(tiers, responses):
+            hits = response.points if response else []
+            print(f"   [{tier}] Found {len(hits)} potential matches")
+            
+            if not hits:
+                continue
             for i, hit in enumerate(hits):
                 score = hit.score
                 question = hit.payload.get("question", "?")[:50]
@@ -86,45 +298,133 @@ def check_cache(query: str):
             
             if score > settings.THRESHOLD:
                 cached_answer = best_match.payload["answer"]
-                print(f"\n   ✅ CACHE HIT! Score {score:.4f} > {settings.THRESHOLD}")
+                print(f"\n   ✅ CACHE HIT ({tier})! Score {score:.4f} > {settings.THRESHOLD}")
                 print(f"   📤 Returning cached answer: '{cached_answer[:100]}...'")
+                _count_hit(str(best_match.id))
+                answer_cache.put(query, tenant, cached_answer, point_id=str(best_match.id))
+                l2_hits += 1
                 return cached_answer
-            else:
-                print(f"\n   ❌ CACHE MISS. Best score {score:.4f} < {settings.THRESHOLD}")
-        else:
-            print(f"   ❌ CACHE MISS. No matches found.")
+            print(f"   ❌ [{tier}] Best score {score:.4f} < {settings.THRESHOLD}")
         
+        print(f"\n   ❌ CACHE MISS.")
+        l2_misses += 1
         return None
     except Exception as e:
         print(f"   ⚠️ Cache check failed: {e}")
         return None
 
-def save_to_cache(query: str, answer: str):
+def _count_hit(hit_point: str):
+    """
+    Counts a cache hit (L1 or L2) for LRU/LFU eviction. Hits are written to
+    Qdrant in one batch every CACHE_HIT_FLUSH_SECONDS instead of once per request.
+    """
+    global _hit_flush
+    count, _ = _pending_hits.get(hit_point, (0, 0.0))
+    _pending_hits[hit_point] = (count + 1, time.time())
+    if _hit_flush is None or _hit_flush.done():
+        _hit_flush = asyncio.create_task(_flush_hits_later())
+
+async def _flush_hits_later():
+    await asyncio.sleep(settings.CACHE_HIT_FLUSH_SECONDS)
+    await _flush_hits()
+
+async def _flush_hits():
     """
-    Saves a new Q&A pair to the memory.
+    Adds the pending hit counts to the points' hits and last_hit_at.
+    Not atomic across workers: concurrent flushes may lose some counts, which is fine for eviction.
+    Points that no longer exist (evicted, or never saved) are skipped.
     """
+    global _pending_hits
+    if not _pending_hits or _client is None:
+        return
+    pending, _pending_hits = _pending_hits, {}
     try:
-        client = _get_client()
-        embedder = _get_embedder()
+        points = await _client.retrieve(
+            collection_name=COLLECTION_NAME,
+            ids=list(pending),
+            with_payload=["hits"],
+            with_vectors=False
+        )
+        operations = []
+        for point in points:
+            count, last_hit_at = pending[str(point.id)]
+            operations.append(models.SetPayloadOperation(set_payload=models.SetPayload(
+                payload={"hits": (point.payload.get("hits") or 0) + count, "last_hit_at": last_hit_at},
+                points=[point.id]
+            )))
+        if operations:
+            await _client.batch_update_points(
+                collection_name=COLLECTION_NAME, update_operations=operations, wait=False
+            )
+    except Exception as e:
+        print(f"   ⚠️ Failed to record {len(pending)} cache hits: {e}")
+
+def remember_answer(query: str, answer: str, user_id: int | None = None):
+    """Puts a freshly generated answer in the L1 cache. The L2 write goes through the job queue."""
+    tenant = _tenant(user_id)
+    # The point save_to_cache will write (unless it skips a near-duplicate)
+    answer_cache.put(query, tenant, answer, point_id=point_id(query, tenant))
+
+def cache_stats() -> dict:
+    """Hit/miss counters per cache tier for /metrics."""
+    return {
+        "l1": answer_cache.stats(),
+        "l2": {"hits": l2_hits, "misses": l2_misses},
+        "embeddings": {"hits": embedding_cache.hits, "misses": embedding_cache.misses},
+    }
+
+async def save_to_cache(
+    query: str, answer: str, user_id: int | None = None, vector: list[float] | None = None
+):
+    """
+    Saves a new Q&A pair to the user's partition of the memory
+    (the shared global partition if there is no user).
+    Pass the query `vector` when it is already known, so workers don't load the embedding model.
+    """
+    try:
+        client = await get_client()
+        tenant = _tenant(user_id)
         
         print(f"\n💾 SAVING TO MEMORY")
         print(f"   Q: '{query[:80]}...'")
         print(f"   A: '{answer[:80]}...'")
         
-        vector = embedder.encode(query).tolist()
+        if vector is None:
+            vector = await embed(query)
+        
+        # Skip near-duplicates: a question check_cache would already answer adds nothing
+        existing = await client.query_points(
+            collection_name=COLLECTION_NAME,
+            query=vector,
+            query_filter=_tenant_filter(tenant),
+            limit=1,
+            score_threshold=settings.THRESHOLD,
+            search_params=_search_params(),
+            with_payload=False,
+            timeout=settings.QDRANT_SEARCH_TIMEOUT
+        )
+        if existing.points:
+            match = existing.points[0]
+            print(f"   ⏭️ Skipped: near-duplicate of {match.id} (score {match.score:.4f})")
+            return
         
-        unique_id = int(time.time() * 1000) 
+        now = time.time()
+        unique_id = point_id(query, tenant)
         
-        client.upsert(
+        # Concurrent saves of the same question land on the same id
+        await client.upsert(
             collection_name=COLLECTION_NAME,
             points=[
                 PointStruct(
                     id=unique_id,
                     vector=vector,
                     payload={
+                        "user_id": tenant,
                         "question": query,
                         "answer": answer,
-                        "timestamp": time.time()
+                        "timestamp": now,
+                        "hits": 0,
+                        "last_hit_at": now
                     }
                 )
             ]
@@ -132,3 +432,4 @@ def save_to_cache(query: str, answer: str):
         print(f"   ✅ Saved with ID: {unique_id}")
     except Exception as e:
         print(f"   ⚠️ Failed to save to cache: {e}")
+        raise  # let the job queue retry
@@ -0,0 +1,196 @@
+"""
+Maintenance Scheduler
+Runs gardener jobs periodically from inside the API process.
+
+Every replica runs the same loop, but a job only starts on the replica that
+wins its Postgres advisory lock. The winner checks maintenance_runs and claims
+the run by inserting a 'running' row, so each job runs once per interval
+across the whole deployment. The lock is transaction-scoped
+(pg_try_advisory_xact_lock), which keeps it valid behind PgBouncer in
+transaction-pooling mode, and only held while the run is claimed: the job
+itself runs outside any transaction, and its result is recorded in a second
+short one.
+"""
+import asyncio
+import hashlib
+import random
+import socket
+import time
+import traceback
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Awaitable, Callable
+from sqlalchemy import select, insert, update, func, and_, or_
+from app.core.config import settings
+from app.database import engine
+from app.models import MaintenanceRun
+
+
+@dataclass
+class ScheduledJob:
+    name: str
+    interval: timedelta
+    run: Callable[[], Awaitable[None]]
+
+    @property
+    def lock_key(self) -> int:
+        """Stable signed 64-bit advisory lock id derived from the job name."""
+        digest = hashlib.blake2b(f"cortex:{self.name}".encode(), digest_size=8).digest()
+        return int.from_bytes(digest, "big", signed=True)
+
+
+class MaintenanceScheduler:
+
+    def __init__(self, jobs: list[ScheduledJob], tick_seconds: int):
+        self.jobs = jobs
+        self.tick_seconds = tick_seconds
+        self.replica = socket.gethostname()
+        self._tasks: list[asyncio.Task] = []
+
+    async def start(self):
+        if self._tasks:
+            return
+        print(f"⏰ Scheduler started: {', '.join(job.name for job in self.jobs)}")
+        self._tasks = [asyncio.create_task(self._loop(job)) for job in self.jobs]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _loop(self, job: ScheduledJob):
+        # Spread replicas out so they don't all hit Postgres on the same second
+        await asyncio.sleep(random.uniform(0, self.tick_seconds))
+        while True:
+            try:
+                await self.run_if_due(job)
+            except Exception as e:
+                print(f"⚠️ Scheduler: could not check '{job.name}': {e}")
+            await asyncio.sleep(self.tick_seconds)
+
+    async def run_if_due(self, job: ScheduledJob) -> bool:
+        """
+        Runs the job if this replica wins the lock and no run started within
+        the interval (or is still running). The lock is only held while the run is claimed.
+        """
+        run_id = await self._claim(job)
+        if run_id is None:
+            return False
+
+        print(f"⏰ Scheduler: running '{job.name}' on {self.replica}")
+        started = time.perf_counter()
+        error = None
+        try:
+            await job.run()
+        except Exception as e:
+            error = "".join(traceback.format_exception_only(e)).strip()
+        except BaseException:
+            # Cancelled (e.g. shutdown): don't leave a 'running' row blocking the job
+            duration_ms = (time.perf_counter() - started) * 1000
+            try:
+                await asyncio.shield(self._finish(run_id, duration_ms, "Cancelled"))
+            except Exception as e:
+                print(f"⚠️ Scheduler: could not record cancelled '{job.name}': {e}")
+            raise
+        duration_ms = (time.perf_counter() - started) * 1000
+
+        await self._finish(run_id, duration_ms, error)
+        if error:
+            print(f"❌ Scheduler: '{job.name}' failed after {duration_ms:.0f} ms: {error}")
+        else:
+            print(f"✅ Scheduler: '{job.name}' finished in {duration_ms:.0f} ms")
+        return True
+
+    async def _finish(self, run_id: int, duration_ms: float, error: str | None):
+        """Records the outcome of a claimed run."""
+        async with engine.begin() as conn:
+            await conn.execute(
+                update(MaintenanceRun)
+                .where(MaintenanceRun.id == run_id)
+                .values(status="failed" if error else "success", duration_ms=duration_ms, error=error)
+            )
+
+    async def _claim(self, job: ScheduledJob) -> int | None:
+        """
+        Inserts a 'running' row for the job if it is due, under the advisory lock.
+        Returns the row id, or None if another replica has it or it ran recently.
+        A 'running' row older than SCHEDULER_RUN_TIMEOUT_MINUTES is from a replica
+        that died mid-run and no longer blocks the job.
+        """
+        async with engine.begin() as conn:
+            is_leader = await conn.scalar(select(func.pg_try_advisory_xact_lock(job.lock_key)))
+            if not is_leader:
+                return None
+
+            run_timeout = timedelta(minutes=settings.SCHEDULER_RUN_TIMEOUT_MINUTES)
+            recent_run = await conn.scalar(
+                select(func.count())
+                .select_from(MaintenanceRun)
+                .where(
+                    MaintenanceRun.job == job.name,
+                    or_(
+                        MaintenanceRun.started_at > func.now() - job.interval,
+                        and_(
+                            MaintenanceRun.status == "running",
+                            MaintenanceRun.started_at > func.now() - run_timeout
+                        )
+                    )
+                )
+            )
+            if recent_run:
+                return None
+
+            # started_at = now() is the transaction start, i.e. when the lock was taken
+            return await conn.scalar(
+                insert(MaintenanceRun)
+                .values(job=job.name, status="running", started_at=func.now(), replica=self.replica)
+                .returning(MaintenanceRun.id)
+            )
+
+    async def stats(self) -> dict:
+        """Latest run of every job."""
+        latest = (
+            select(MaintenanceRun.job, func.max(MaintenanceRun.id).label("id"))
+            .group_by(MaintenanceRun.job)
+            .subquery()
+        )
+        async with engine.connect() as conn:
+            result = await conn.execute(
+                select(MaintenanceRun).join(latest, MaintenanceRun.id == latest.c.id)
+            )
+            runs = result.mappings().all()
+        return {
+            run["job"]: {
+                "status": run["status"],
+                "started_at": run["started_at"].isoformat(),
+                "duration_ms": run["duration_ms"],
+                "replica": run["replica"],
+                "error": run["error"],
+            }
+            for run in runs
+        }
+
+
+def _default_jobs() -> list[ScheduledJob]:
+    from app.services import gardener
+    return [
+        ScheduledJob(
+            name="prune_graph",
+            interval=timedelta(minutes=settings.PRUNE_GRAPH_INTERVAL_MINUTES),
+            run=gardener.prune_graph
+        ),
+        ScheduledJob(
+            name="clean_old_vectors",
+            interval=timedelta(minutes=settings.CLEAN_VECTORS_INTERVAL_MINUTES),
+            run=gardener.clean_old_vectors
+        ),
+        ScheduledJob(
+            name="evict_cache",
+            interval=timedelta(minutes=settings.EVICT_CACHE_INTERVAL_MINUTES),
+            run=gardener.evict_cache_entries
+        ),
+    ]
+
+
+scheduler = MaintenanceScheduler(_default_jobs(), tick_seconds=settings.SCHEDULER_TICK_SECONDS)
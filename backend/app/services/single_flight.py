@@ -0,0 +1,153 @@
+"""
+Single Flight
+Coalesces identical concurrent chat queries into one LLM call.
+
+The first request for a query starts a flight: a background task that runs
+the answer source (graph lookup + LLM) and records every token it produces.
+Requests for the same normalized query that arrive while the flight is in
+the air join it instead of calling the LLM again. Streaming requests replay
+the tokens produced so far and then follow the live stream; non-streaming
+requests wait for the full answer, so the source must always stream. The
+flight keeps running if its first caller disconnects, so the others still
+get their answer. If the source fails, every joiner sees the error and the
+completion callback is skipped.
+
+When the flight lands it is unregistered, then its completion callback runs
+once for everyone who joined (cache writes, distillation). The callback must
+fill the L1 cache before its first await, so requests arriving after that
+point hit the cache instead of starting another flight. A flight started speculatively can be
+abandoned; it is cancelled when nobody else is waiting on it.
+"""
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable
+from app.services.embedding_service import normalize_query
+
+
+class Flight:
+
+    def __init__(self):
+        self.tokens: list[str] = []
+        self.done = False
+        self.error: Exception | None = None
+        self.user_ids: set[int | None] = set()
+        self.waiting = 0
+        self.task: asyncio.Task | None = None
+        self._changed = asyncio.Condition()
+
+    async def _publish(self, token: str | None = None, done: bool = False):
+        async with self._changed:
+            if token is not None:
+                self.tokens.append(token)
+            self.done = self.done or done
+            self._changed.notify_all()
+
+    async def stream(self) -> AsyncIterator[str]:
+        """Every token of the answer, from the first one, as it is produced."""
+        position = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: len(self.tokens) > position or self.done)
+                new_tokens = self.tokens[position:]
+                finished = self.done
+            for token in new_tokens:
+                yield token
+            position += len(new_tokens)
+            if finished and position == len(self.tokens):
+                if self.error is not None:
+                    raise self.error
+                return
+
+    async def result(self) -> str:
+        """The full answer once the flight lands."""
+        return "".join([token async for token in self.stream()])
+
+
+class SingleFlight:
+
+    def __init__(self):
+        self._flights: dict[str, Flight] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self.started = 0
+        self.coalesced = 0
+
+    def join(
+        self,
+        query: str,
+        user_id: int | None,
+        source: Callable[[], AsyncIterator[str]],
+        on_done: Callable[[str, set[int | None]], Awaitable[None]]
+    ) -> Flight:
+        """
+        Returns the in-flight answer for `query`, starting one with `source`
+        if there is none. `on_done(answer, user_ids)` runs once after a successful flight.
+        """
+        key = normalize_query(query)
+        flight = self._flights.get(key)
+        if flight is not None:
+            flight.user_ids.add(user_id)
+            flight.waiting += 1
+            self.coalesced += 1
+            print(f"🛫 Joined in-flight answer for '{query[:50]}...' ({flight.waiting} waiting)")
+            return flight
+
+        flight = Flight()
+        flight.user_ids.add(user_id)
+        flight.waiting = 1
+        self._flights[key] = flight
+        self.started += 1
+        flight.task = asyncio.create_task(self._fly(key, flight, source, on_done))
+        self._tasks.add(flight.task)
+        flight.task.add_done_callback(self._tasks.discard)
+        return flight
+
+    def abandon(self, query: str, flight: Flight):
+        """
+        Called by a request that no longer needs the answer (e.g. a speculative
+        LLM call beaten by a cache hit). Cancels the flight if nobody else is waiting.
+        """
+        flight.waiting -= 1
+        if flight.waiting > 0 or flight.done:
+            return
+        self._unregister(normalize_query(query), flight)
+        flight.error = RuntimeError("Flight abandoned")
+        flight.task.cancel()
+
+    async def _fly(self, key: str, flight: Flight, source, on_done):
+        try:
+            try:
+                async for token in source():
+                    await flight._publish(token)
+            except Exception as e:
+                flight.error = e
+            finally:
+                await flight._publish(done=True)
+
+            # Unregister before taking the user snapshot, so nobody can join after it.
+            # Later requests start a new flight (and will hit the cache instead)
+            self._unregister(key, flight)
+            if flight.error is None:
+                try:
+                    await on_done("".join(flight.tokens), set(flight.user_ids))
+                except Exception as e:
+                    print(f"⚠️ Post-answer work failed: {e}")
+        finally:
+            self._unregister(key, flight)
+
+    def _unregister(self, key: str, flight: Flight):
+        if self._flights.get(key) is flight:
+            self._flights.pop(key)
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._flights),
+            "started": self.started,
+            "coalesced": self.coalesced,
+        }
+
+
+single_flight = SingleFlight()
@@ -0,0 +1,56 @@
+"""
+Background Workers
+Drains the durable Postgres job queue (JOB_QUEUE_BACKEND=postgres).
+
+Run with:
+  python -m app.workers
+"""
+import asyncio
+import signal
+from app.core.config import settings
+from app.services.job_queue import PostgresJobQueue
+
+
+async def _worker_loop(queue: PostgresJobQueue, stop: asyncio.Event, worker_id: int):
+    while not stop.is_set():
+        try:
+            processed = await queue.process_one()
+        except Exception as e:
+            print(f"⚠️ Worker {worker_id}: queue error: {e}")
+            processed = False
+        if not processed:
+            # Nothing due - wait for the next poll (or shutdown)
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=settings.JOB_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+
+async def run_worker(concurrency: int = settings.JOB_WORKER_CONCURRENCY):
+    """Runs `concurrency` job loops until SIGINT/SIGTERM, then lets in-flight jobs finish."""
+    from app.services import memory_service, graph_service
+    from app.services.embedding_service import embedder
+    from app.services.llm import llm_service
+
+    queue = PostgresJobQueue(max_attempts=settings.JOB_MAX_ATTEMPTS)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:  # Windows
+            pass
+
+    print(f"👷 Job worker started (concurrency={concurrency})")
+    try:
+        await memory_service.init_client()
+        await graph_service.init_driver()
+        await asyncio.gather(*[
+            _worker_loop(queue, stop, i) for i in range(concurrency)
+        ])
+    finally:
+        await llm_service.aclose()
+        await embedder.close()
+        await memory_service.close_client()
+        await graph_service.close_driver()
+        print("👷 Job worker stopped")
@@ -0,0 +1,5 @@
+import asyncio
+from app.workers import run_worker
+
+if __name__ == "__main__":
+    asyncio.run(run_worker())
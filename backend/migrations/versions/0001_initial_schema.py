@@ -0,0 +1,96 @@
+"""initial schema
+
+Tables as they were created by Base.metadata.create_all before migrations
+existed. Databases created that way already have them, so each table is only
+created if it is missing; the revision is then recorded as applied.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+revision: str = "0001"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if context.is_offline_mode():
+        # `alembic upgrade head --sql` has no database to inspect: emit every table
+        existing = set()
+    else:
+        existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if "users" not in existing:
+        op.create_table(
+            "users",
+            sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column("email", sa.String(255), nullable=False),
+            sa.Column("hashed_password", sa.String(255), nullable=False),
+            sa.Column("name", sa.String(255), nullable=True),
+            sa.Column("created_at", sa.DateTime(), server_default=sa.func.now(), nullable=False),
+        )
+        op.create_index("ix_users_email", "users", ["email"], unique=True)
+
+    if "conversations" not in existing:
+        op.create_table(
+            "conversations",
+            sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column("title", sa.String(255), nullable=False),
+            sa.Column("owner_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+            sa.Column("created_at", sa.DateTime(), server_default=sa.func.now(), nullable=False),
+            sa.Column("updated_at", sa.DateTime(), server_default=sa.func.now(), nullable=False),
+        )
+
+    if "messages" not in existing:
+        op.create_table(
+            "messages",
+            sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column("conversation_id", sa.Integer(), sa.ForeignKey("conversations.id", ondelete="CASCADE"), nullable=False),
+            sa.Column("role", sa.String(20), nullable=False),
+            sa.Column("content", sa.Text(), nullable=False),
+            sa.Column("created_at", sa.DateTime(), server_default=sa.func.now(), nullable=False),
+        )
+
+    if "jobs" not in existing:
+        op.create_table(
+            "jobs",
+            sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column("kind", sa.String(50), nullable=False),
+            sa.Column("payload", sa.JSON(), nullable=False),
+            sa.Column("status", sa.String(20), nullable=False),
+            sa.Column("attempts", sa.Integer(), nullable=False),
+            sa.Column("max_attempts", sa.Integer(), nullable=False),
+            sa.Column("last_error", sa.Text(), nullable=True),
+            sa.Column("run_at", sa.DateTime(), server_default=sa.func.now(), nullable=False),
+            sa.Column("created_at", sa.DateTime(), server_default=sa.func.now(), nullable=False),
+            sa.Column("updated_at", sa.DateTime(), server_default=sa.func.now(), nullable=False),
+        )
+        op.create_index("ix_jobs_status_run_at", "jobs", ["status", "run_at"])
+
+    if "maintenance_runs" not in existing:
+        op.create_table(
+            "maintenance_runs",
+            sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column("job", sa.String(50), nullable=False),
+            sa.Column("status", sa.String(20), nullable=False),
+            sa.Column("started_at", sa.DateTime(), nullable=False),
+            sa.Column("duration_ms", sa.Float(), nullable=False),
+            sa.Column("error", sa.Text(), nullable=True),
+            sa.Column("replica", sa.String(255), nullable=True),
+        )
+        op.create_index("ix_maintenance_runs_job_started_at", "maintenance_runs", ["job", "started_at"])
+
+
+def downgrade() -> None:
+    op.drop_table("maintenance_runs")
+    op.drop_table("jobs")
+    op.drop_table("messages")
+    op.drop_table("conversations")
+    op.drop_table("users")
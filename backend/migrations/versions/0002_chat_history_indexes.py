@@ -0,0 +1,55 @@
+"""chat history indexes
+
+Composite indexes for the sidebar and history queries:
+conversations by owner, newest first, and messages by conversation in order.
+Built CONCURRENTLY on Postgres so the messages table stays writable meanwhile.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_conversations_owner_id_updated_at",
+            "conversations",
+            ["owner_id", sa.text("updated_at DESC")],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_messages_conversation_id_created_at",
+            "messages",
+            ["conversation_id", "created_at"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_messages_conversation_id_created_at",
+            table_name="messages",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+        op.drop_index(
+            "ix_conversations_owner_id_updated_at",
+            table_name="conversations",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
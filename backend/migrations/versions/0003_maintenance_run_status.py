@@ -0,0 +1,31 @@
+"""maintenance run status
+
+Scheduled runs are claimed with a 'running' row before the job starts and
+completed afterwards, so duration_ms is unknown until then.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "0003"
+down_revision: Union[str, None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # batch mode is a plain ALTER on Postgres; SQLite (local dev) needs the table copied
+    with op.batch_alter_table("maintenance_runs") as batch:
+        batch.alter_column("duration_ms", existing_type=sa.Float(), nullable=True)
+
+
+def downgrade() -> None:
+    op.execute("DELETE FROM maintenance_runs WHERE duration_ms IS NULL")
+    with op.batch_alter_table("maintenance_runs") as batch:
+        batch.alter_column("duration_ms", existing_type=sa.Float(), nullable=False)
@@ -0,0 +1,82 @@
+"""chat history index ids
+
+Adds id as the last column of the chat history indexes, so the keyset page
+cursor (timestamp, id) and its ORDER BY are served by the index even when
+rows share a timestamp. The new indexes are built CONCURRENTLY before the
+old ones are dropped, so the queries are never left without one.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "0004"
+down_revision: Union[str, None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # CREATE/DROP INDEX CONCURRENTLY cannot run inside a transaction
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_conversations_owner_id_updated_at_id",
+            "conversations",
+            ["owner_id", sa.text("updated_at DESC"), sa.text("id DESC")],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_messages_conversation_id_created_at_id",
+            "messages",
+            ["conversation_id", "created_at", "id"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.drop_index(
+            "ix_conversations_owner_id_updated_at",
+            table_name="conversations",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+        op.drop_index(
+            "ix_messages_conversation_id_created_at",
+            table_name="messages",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_conversations_owner_id_updated_at",
+            "conversations",
+            ["owner_id", sa.text("updated_at DESC")],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_messages_conversation_id_created_at",
+            "messages",
+            ["conversation_id", "created_at"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.drop_index(
+            "ix_messages_conversation_id_created_at_id",
+            table_name="messages",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+        op.drop_index(
+            "ix_conversations_owner_id_updated_at_id",
+            table_name="conversations",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )